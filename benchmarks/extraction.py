@@ -0,0 +1,167 @@
+"""
+Offline benchmark of license extraction over the recorded html pages in `benchmarks/corpus`.
+
+Reports pages/sec, best/p50/p99 latency and peak memory per page for each html extractor
+backend and for `License.with_parsed_url`, and fails when a measurement regresses
+by more than the tolerance against the stored baseline. Best-of-N times are compared,
+scaled by a calibration workload timed in both runs, so a baseline recorded on
+another machine or under different load still applies:
+
+    python -m benchmarks.extraction
+    python -m benchmarks.extraction --update-baseline
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from licensing.license import License
+from licensing.metadata_extractors import EXTRACTORS
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCHMARK_DIR, "corpus")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "extraction_baseline.json")
+PAGE_URL = "https://example.com/benchmark"
+# measurements compared against the baseline (lower is better), with the smallest
+# absolute difference that counts as a regression so sub-microsecond timings don't flap
+COMPARED_METRICS = {"best_ms": 0.25, "peak_kb": 4}
+# timings scaled by the machine speed measured with the calibration workload
+TIMED_METRICS = {"best_ms"}
+CALIBRATION_KEY = "calibration"
+
+
+def load_corpus():
+    corpus = {}
+    for filename in sorted(os.listdir(CORPUS_DIR)):
+        if filename.endswith(".html"):
+            with open(os.path.join(CORPUS_DIR, filename), encoding="utf-8") as f:
+                corpus[filename.removesuffix(".html")] = f.read()
+    return corpus
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def measure(functions, repeat):
+    """
+    Times every function `repeat` times, in interleaved rounds so that a slowdown of the
+    machine during the run hits all of them alike, with the garbage collector paused
+    while timing.
+    """
+    durations = {key: [] for key in functions}
+    for _ in range(repeat):
+        for key, function in functions.items():
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                function()
+                durations[key].append(time.perf_counter() - start)
+            finally:
+                gc.enable()
+
+    results = {}
+    for key, function in functions.items():
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings = sorted(durations[key])
+        results[key] = {
+            "pages_per_sec": round(len(timings) / sum(timings), 2),
+            "best_ms": round(timings[0] * 1000, 3),
+            "p50_ms": round(percentile(timings, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+            "peak_kb": round(peak / 1024, 1),
+        }
+    return results
+
+
+def calibration_workload():
+    # pure Python work of the same kind as extraction: string scanning and dict building
+    counts = {}
+    for word in ("license copyright creative commons attribution " * 2000).split():
+        counts[word.lower()] = counts.get(word.lower(), 0) + 1
+    return counts
+
+
+def run(repeat):
+    functions = {CALIBRATION_KEY: calibration_workload}
+    for page, html in load_corpus().items():
+        for name, extractor in EXTRACTORS.items():
+            functions[f"{name}/{page}"] = (
+                lambda html=html, extractor=extractor: License.parse_html_for_metadata(html, PAGE_URL, False, extractor)
+            )
+        meta_info = EXTRACTORS["scan"].extract(html, PAGE_URL)
+        functions[f"with_parsed_url/{page}"] = lambda meta_info=meta_info: License.with_parsed_url(meta_info)
+    return measure(functions, repeat)
+
+
+def regressions(results, baseline, tolerance, time_tolerance):
+    # how much slower this machine runs the calibration workload than the baseline's did
+    speed = results[CALIBRATION_KEY]["best_ms"] / baseline[CALIBRATION_KEY]["best_ms"] if CALIBRATION_KEY in baseline else 1.0
+    found = []
+    for key, measurements in results.items():
+        if key not in baseline or key == CALIBRATION_KEY:
+            continue
+        for metric, min_difference in COMPARED_METRICS.items():
+            if metric not in baseline[key]:
+                continue
+            timed = metric in TIMED_METRICS
+            expected = baseline[key][metric] * (speed if timed else 1.0)
+            allowed = time_tolerance if timed else tolerance
+            limit = max(expected * (1 + allowed), expected + min_difference)
+            if measurements[metric] > limit:
+                found.append(f"{key} {metric}: {measurements[metric]} > {expected:.3f} (+{allowed:.0%})")
+    return found
+
+
+def print_results(results):
+    print(f"{'benchmark':<32} {'pages/sec':>10} {'best ms':>10} {'p50 ms':>10} {'p99 ms':>10} {'peak kB':>10}")
+    for key, m in results.items():
+        print(f"{key:<32} {m['pages_per_sec']:>10} {m['best_ms']:>10} {m['p50_ms']:>10} {m['p99_ms']:>10} {m['peak_kb']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark license extraction over the recorded html corpus.")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of timed runs per page.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed memory growth ratio against the baseline.")
+    parser.add_argument("--time-tolerance", type=float, default=0.5,
+                        help="Allowed slowdown ratio against the baseline, wider since timings on a shared machine are noisy.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Path of the baseline json file.")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline.")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    print_results(results)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline to record one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    found = regressions(results, baseline, args.tolerance, args.time_tolerance)
+    if found:
+        print("\nRegressions against the baseline:")
+        for regression in found:
+            print("  " + regression)
+        sys.exit(1)
+    print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Startup benchmark: cold import time of each entry point, measured in fresh interpreters
+with `-X importtime`, and compared against the budgets in `startup_budget.json`.
+Fails when an entry point goes over its budget, e.g. after a heavy dependency got
+imported at module level again:
+
+    python -m benchmarks.startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARK_DIR)
+BUDGET_PATH = os.path.join(BENCHMARK_DIR, "startup_budget.json")
+
+
+def import_time_ms(module):
+    """Returns the cumulative import time of `module` in a fresh interpreter, and its slowest dependencies."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPOSITORY_DIR, capture_output=True, text=True, check=True
+    )
+    dependencies = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        ms = int(cumulative) / 1000
+        # nested imports are indented and listed before the module that imported them
+        if name.startswith("  "):
+            dependencies.append((name.strip(), ms))
+        elif name.strip() == module:
+            return ms, sorted(dependencies, key=lambda name_ms: -name_ms[1])[:3]
+        else:
+            dependencies = []
+    raise RuntimeError(f"{module} was not imported")
+
+def measure(module, repeat):
+    runs = [import_time_ms(module) for _ in range(repeat)]
+    return statistics.median(total for total, _ in runs), runs[-1][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the cold import time of the entry points against their budget.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreters per entry point.")
+    parser.add_argument("--budget", default=BUDGET_PATH, help="Path of the budget json file.")
+    args = parser.parse_args()
+
+    with open(args.budget) as f:
+        budgets = json.load(f)
+
+    over_budget = []
+    print(f"{'entry point':<24} {'import ms':>10} {'budget ms':>10}   slowest imports")
+    for module, budget in budgets.items():
+        median, slowest = measure(module, args.repeat)
+        details = ", ".join(f"{name} {ms:.0f}" for name, ms in slowest)
+        print(f"{module:<24} {median:>10.1f} {budget:>10}   {details}")
+        if median > budget:
+            over_budget.append(f"{module}: {median:.1f} ms > {budget} ms")
+
+    if over_budget:
+        print("\nEntry points over their import time budget:")
+        for line in over_budget:
+            print("  " + line)
+        sys.exit(1)
+    print("\nAll entry points within their import time budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import os
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 # --- Set up Google APIs ---
 SERVICE_ACCOUNT_FILE = 'internals/credentials.json'  # Update with your path
@@ -14,8 +16,33 @@ SCOPES = [
     'https://www.googleapis.com/auth/devstorage.read_only'
 ]
 
+# credentials and API clients are created once per process and shared by all threads
+_lock = threading.RLock()
+_creds = None
+_clients = {}
+_discovery_documents = {}
+_services = threading.local()
+
+
+def get_creds() -> "Credentials":
+    """
+    Returns the process-wide credentials, loading them from the token file on first use.
+    The access token is refreshed in the background before it expires, so the token file
+    is only written when the user logs in or a stored token had to be refreshed on load.
+    """
+    global _creds
+    with _lock:
+        if _creds is None:
+            creds = load_creds()
+            creds.with_non_blocking_refresh()
+            _creds = creds
+        return _creds
 
-def get_creds() -> Credentials:
+
+def load_creds() -> "Credentials":
+    from google.oauth2.credentials import Credentials
+    from google.auth.transport.requests import Request
+    from google_auth_oauthlib.flow import InstalledAppFlow
     creds = None
     # The file token.json stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first time.
@@ -30,7 +57,45 @@ def get_creds() -> Credentials:
             flow = InstalledAppFlow.from_client_secrets_file(SERVICE_ACCOUNT_FILE, SCOPES)
             creds = flow.run_local_server(port=0)
         # Save the credentials for the next run
-        with open(TOKEN_FILE, "w") as token:
-            token.write(creds.to_json())
+        save_creds(creds)
 
     return creds
+
+
+def save_creds(creds):
+    # written aside and renamed so concurrent processes never read a partial token file
+    temporary_file = f"{TOKEN_FILE}.{os.getpid()}.tmp"
+    with open(temporary_file, "w") as token:
+        token.write(creds.to_json())
+    os.replace(temporary_file, TOKEN_FILE)
+
+
+def get_client(key, factory):
+    """Returns the process-wide client registered under `key`, created with `factory()` on first use."""
+    with _lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def get_gspread_client():
+    from gspread import authorize
+    return get_client("gspread", lambda: authorize(get_creds()))
+
+
+def get_service(name, version):
+    """
+    Returns a discovery-based API client, e.g. get_service("drive", "v3").
+    Their HTTP connections aren't thread-safe, so each thread gets its own client,
+    built from a discovery document that is only read once.
+    """
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+    services = _services.__dict__
+    if (name, version) not in services:
+        with _lock:
+            if (name, version) not in _discovery_documents:
+                _discovery_documents[name, version] = get_static_doc(name, version)
+            document = _discovery_documents[name, version]
+        services[name, version] = build_from_document(document, credentials=get_creds())
+    return services[name, version]
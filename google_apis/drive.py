@@ -1,115 +1,205 @@
-from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.http import MediaInMemoryUpload, MediaFileUpload
+import hashlib
 import os
-from .credentials import get_creds
+import queue
+import threading
+from .credentials import get_creds, get_service
+from .drive_uploader import DriveUploader
+
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# folder ids by (parent folder id, folder name), kept for the whole process
+_folder_ids = {}
+_folder_ids_lock = threading.Lock()
 
 
 def get_drive_service():
-    creds = get_creds()
-    service = build("drive", "v3", credentials=creds)
-    return creds, service
+    return get_creds(), get_service("drive", "v3")
 
 
 def get_or_create_subfolder(service, parent_folder_id, subfolder_name):
-    # Search for the subfolder
-    query = (
-        f"'{parent_folder_id}' in parents and "
-        f"name = '{subfolder_name}' and "
-        f"mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    )
-    response = service.files().list(q=query, fields="files(id,name)").execute()
-    files = response.get('files', [])
-    if files:
-        return files[0]['id']
+    folder_id = find_subfolder(service, parent_folder_id, subfolder_name)
+    if folder_id is not None:
+        return folder_id
     # Create the subfolder
     file_metadata = {
         'name': subfolder_name,
-        'mimeType': 'application/vnd.google-apps.folder',
+        'mimeType': FOLDER_MIME_TYPE,
         'parents': [parent_folder_id]
     }
     file = service.files().create(body=file_metadata, fields='id').execute()
-    return file.get('id')
+    with _folder_ids_lock:
+        _folder_ids[parent_folder_id, subfolder_name] = file['id']
+    return file['id']
+
+
+def find_subfolder(service, parent_folder_id, subfolder_name):
+    """Returns the id of the named subfolder, or None. Found ids are cached for the rest of the process."""
+    with _folder_ids_lock:
+        if (parent_folder_id, subfolder_name) in _folder_ids:
+            return _folder_ids[parent_folder_id, subfolder_name]
+    # Search for the subfolder
+    query = (
+        f"'{parent_folder_id}' in parents and "
+        f"name = '{escape_query(subfolder_name)}' and "
+        f"mimeType = '{FOLDER_MIME_TYPE}' and trashed = false"
+    )
+    response = service.files().list(q=query, fields="files(id)", pageSize=1).execute()
+    files = response.get('files', [])
+    if not files:
+        return None
+    with _folder_ids_lock:
+        _folder_ids[parent_folder_id, subfolder_name] = files[0]['id']
+    return files[0]['id']
 
-def upload_html_and_thumbs_to_drive(html, folder_id, thumb_paths):
-    import os
+
+def upload_html_and_thumbs_to_drive(html, folder_id, thumb_paths, upload_index=None):
+    """
+    Publishes the gallery html and its thumbnails, only uploading what changed since
+    the files recorded in `upload_index` or found in the folders: unchanged files are
+    reused, changed files are updated in place.
+    """
     creds, service = get_drive_service()
+    uploader = DriveUploader()
+    try:
+        # 1. Upload HTML file (to main folder)
+        file = publish_html(uploader, upload_index, html, folder_id)
 
-    # 1. Upload HTML file (to main folder)
-    file_metadata = {
-        'name': 'attributions.html',
-        'parents': [folder_id],
-        'mimeType': 'text/html',
-    }
-    media = MediaInMemoryUpload(html.encode('utf-8'), mimetype="text/html")
-    file = service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields='id,webViewLink'
-    ).execute()
-
-    # Make the HTML file public
-    service.permissions().create(
-        fileId=file['id'],
-        body={"type": "anyone", "role": "reader"},
-    ).execute()
-    print(f"Attributions file URL: {file.get('webViewLink')}")
-
-    # 2. Get or create thumbnails subfolder
-    thumbnails_folder_id = get_or_create_subfolder(service, folder_id, "thumbnails")
-
-    # 3. Upload thumbnails to the thumbnails subfolder
+        # 2. Get or create thumbnails subfolder
+        thumbnails_folder_id = get_or_create_subfolder(service, folder_id, "thumbnails")
+
+        # 3. Upload the new or changed thumbnails to the thumbnails subfolder, concurrently
+        uploaded_paths = list(dict.fromkeys(thumb_path for thumb_path in thumb_paths if thumb_path is not None))
+        thumb_ids = publish_files(uploader, upload_index, thumbnails_folder_id, [
+            (
+                os.path.basename(thumb_path),
+                'image/jpeg',
+                file_md5(thumb_path),
+                lambda thumb_path=thumb_path: MediaFileUpload(thumb_path, mimetype='image/jpeg')
+            )
+            for thumb_path in uploaded_paths
+        ])
+        thumb_ids = dict(zip(uploaded_paths, thumb_ids))
+    finally:
+        uploader.close()
+
+    # Get direct view URL for <img src="">
     thumb_urls = []
     for thumb_path in thumb_paths:
-        thumb_name = os.path.basename(thumb_path)
-        thumb_metadata = {
-            'name': thumb_name,
-            'parents': [thumbnails_folder_id],
-            'mimeType': 'image/jpeg'
-        }
-        media = MediaFileUpload(thumb_path, mimetype='image/jpeg')
-        thumb_file = service.files().create(
-            body=thumb_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
+        thumb_id = thumb_ids.get(thumb_path)
+        thumb_urls.append(None if thumb_id is None else f"https://drive.google.com/uc?id={thumb_id}")
 
-        # Make thumbnail public
-        service.permissions().create(
-            fileId=thumb_file['id'],
-            body={"type": "anyone", "role": "reader"},
-        ).execute()
+    return file, thumb_urls
 
-        # Get direct view URL for <img src="">
-        direct_url = f"https://drive.google.com/uc?id={thumb_file['id']}"
-        thumb_urls.append(direct_url)
-        print(f"Thumbnail uploaded: {direct_url}")
 
-    return file, thumb_urls
+def publish_html(uploader, upload_index, html, folder_id):
+    content = html.encode('utf-8')
+    [file_id] = publish_files(uploader, upload_index, folder_id, [(
+        'attributions.html',
+        'text/html',
+        hashlib.md5(content).hexdigest(),
+        lambda: MediaInMemoryUpload(content, mimetype="text/html")
+    )])
+    if file_id is None:
+        raise RuntimeError("Could not publish attributions.html")
+    file = {'id': file_id, 'webViewLink': f"https://drive.google.com/file/d/{file_id}/view"}
+    print(f"Attributions file URL: {file['webViewLink']}")
+    return file
 
 
-def upload_html_to_drive(html, folder_id):
-    creds, service = get_drive_service()
-    file_metadata = {
-        'name': 'attributions.html',
-        'parents': [folder_id],
-        'mimeType': 'text/html',
-    }
-    media = MediaInMemoryUpload(html.encode('utf-8'), mimetype="text/html")
+def publish_files(uploader, upload_index, folder_id, files):
+    """
+    Makes sure the folder holds each (name, mime_type, md5, make_media) file with that content,
+    and returns their Drive file ids, None for the files that failed.
+    A file is reused when a file with the same md5 is already in the folder according to the
+    upload index or, failing that, to the folder listing. Otherwise the file of that name is
+    updated in place, or a new file is created. Indexed files that are no longer in the
+    folder listing, deleted or trashed since, are forgotten and uploaded again. Every file
+    that isn't public yet, new or one whose grant failed in an earlier run, is made public.
+    """
+    remote_files = list_folder_checksums(folder_id) if files else {}
 
-    file = service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields='id,webViewLink'
-    ).execute()
+    def indexed(file_id):
+        # the id of an indexed file that is still in the folder
+        if file_id is not None and ("id", file_id) not in remote_files:
+            upload_index.forget(file_id)
+            return None
+        return file_id
 
-    # Make the file "anyone with the link can view"
-    service.permissions().create(
-        fileId=file['id'],
-        body={"type": "anyone", "role": "reader"},
-    ).execute()
+    file_ids = [None] * len(files)
+    uploads = []
+    for i, (name, mime_type, md5, make_media) in enumerate(files):
+        known = upload_index.get(folder_id, name) if upload_index else None
+        existing_id = indexed(known[0]) if known is not None else None
+        if existing_id is not None and known[1] == md5:
+            file_ids[i] = existing_id
+            continue
+        file_id = indexed(upload_index.find(folder_id, md5)) if upload_index else None
+        if file_id is None:
+            file_id = remote_files.get(("md5", md5))
+            existing_id = existing_id or remote_files.get(("name", name))
+        if file_id is not None:
+            file_ids[i] = file_id
+            if upload_index:
+                upload_index.put(folder_id, name, file_id, md5)
+            continue
 
-    print(f"Attributions file URL: {file.get('webViewLink')}")
-    return file
+        metadata = {'name': name, 'parents': [folder_id], 'mimeType': mime_type}
+        if existing_id is not None:
+            metadata['id'] = existing_id
+        uploads.append((i, metadata, make_media))
+
+    uploaded = uploader.upload_all([(metadata, make_media) for _, metadata, make_media in uploads])
+    created_ids = []
+    for (i, metadata, _), file in zip(uploads, uploaded):
+        if file is None:
+            continue
+        file_ids[i] = file['id']
+        if file['id'] != metadata.get('id'):
+            created_ids.append(file['id'])
+        name, _, md5, _ = files[i]
+        if upload_index:
+            upload_index.put(folder_id, name, file['id'], md5)
+
+    # Make the files that aren't public yet public, in batches
+    private_ids = list(dict.fromkeys(
+        file_id for file_id in file_ids if file_id is not None and ("public", file_id) not in remote_files
+    ))
+    not_public = set(uploader.make_public(private_ids))
+    updated = sum(1 for file in uploaded if file is not None) - len(created_ids)
+    print(f"Uploaded {len(created_ids)} new files, updated {updated} in place, reused {len(files) - len(uploads)} unchanged files")
+    return [None if file_id in not_public else file_id for file_id in file_ids]
+
+
+def list_folder_checksums(folder_id):
+    """
+    Returns the ids of the files in the folder by ("md5", md5Checksum) and by ("name", name),
+    and their ("id", id), plus ("public", id) for those anyone with the link can read.
+    """
+    files = {}
+    for item in iter_folder(folder_id, fields="id, name, md5Checksum, permissions(type)"):
+        files["id", item["id"]] = item["id"]
+        if any(permission["type"] == "anyone" for permission in item.get("permissions", [])):
+            files["public", item["id"]] = item["id"]
+        files.setdefault(("name", item["name"]), item["id"])
+        if "md5Checksum" in item:
+            files.setdefault(("md5", item["md5Checksum"]), item["id"])
+    return files
+
+
+def file_md5(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "md5").hexdigest()
+
+
+def upload_html_to_drive(html, folder_id, upload_index=None):
+    uploader = DriveUploader()
+    try:
+        return publish_html(uploader, upload_index, html, folder_id)
+    finally:
+        uploader.close()
 
 
 def get_folder_id_by_path(service, parent_id, path):
@@ -122,41 +212,106 @@ def get_folder_id_by_path(service, parent_id, path):
     parts = [p for p in path.strip('/').split('/') if p]
     current_id = parent_id
     for part in parts:
-        query = (
-            f"'{current_id}' in parents and name = '{part}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        )
-        results = service.files().list(
-            q=query,
-            fields="files(id, name)",
-            pageSize=10,
-        ).execute()
-        files = results.get("files", [])
-        if not files:
+        folder_id = find_subfolder(service, current_id, part)
+        if folder_id is None:
             raise FileNotFoundError(f"Subdirectory '{part}' not found in parent {current_id}")
-        current_id = files[0]["id"]
+        current_id = folder_id
     return current_id
 
 
-def list_files_in_folder(folder_id, subdirectory=None):
-    creds, service = get_drive_service()
-
+def list_files_in_folder(folder_id, subdirectory=None, fields="id, name"):
+    """Yields the files of the folder page by page, with only the given `fields` of each."""
     if subdirectory is not None:
+        creds, service = get_drive_service()
         folder_id = get_folder_id_by_path(service, folder_id, subdirectory)
+    yield from iter_folder(folder_id, fields)
 
-    files = []
+
+def iter_folder(folder_id, fields="id, name"):
+    service = get_service("drive", "v3")
     page_token = None
     while True:
         response = service.files().list(
             q=f"'{folder_id}' in parents and trashed = false",
-            fields="nextPageToken, files(id, name, mimeType)",
+            fields=f"nextPageToken, files({fields})",
             pageToken=page_token,
             pageSize=1000,
         ).execute()
-        files.extend(response.get("files", []))
+        yield from response.get("files", [])
         page_token = response.get("nextPageToken", None)
         if page_token is None:
             break
-    return files
+
+
+def walk_folder(folder_id, fields="id, name", max_workers=8, buffered_pages=4):
+    """
+    Yields the (path, file) of every file under the folder and its subfolders, listing
+    subfolders concurrently. At most `buffered_pages` pages wait to be consumed, so the
+    memory used doesn't grow with the number of files.
+    """
+    pages = queue.Queue(maxsize=buffered_pages)
+    stopped = threading.Event()
+    pending = 1
+    pending_lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-walk")
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def list_folder(path, current_id):
+        nonlocal pending
+        try:
+            service = get_service("drive", "v3")
+            page_token = None
+            while not stopped.is_set():
+                response = service.files().list(
+                    q=f"'{current_id}' in parents and trashed = false",
+                    fields=f"nextPageToken, files({fields}, mimeType)",
+                    pageToken=page_token,
+                    pageSize=1000,
+                ).execute()
+                files = []
+                for item in response.get("files", []):
+                    if item["mimeType"] == FOLDER_MIME_TYPE:
+                        with pending_lock:
+                            pending += 1
+                        executor.submit(list_folder, f"{path}{item['name']}/", item["id"])
+                    else:
+                        files.append(item)
+                put((path, files))
+                page_token = response.get("nextPageToken", None)
+                if page_token is None:
+                    break
+        except Exception as error:
+            put(error)
+        finally:
+            with pending_lock:
+                pending -= 1
+                done = pending == 0
+            if done:
+                put(None)
+
+    executor.submit(list_folder, "", folder_id)
+    try:
+        while (page := pages.get()) is not None:
+            if isinstance(page, Exception):
+                raise page
+            path, files = page
+            for item in files:
+                yield path, item
+    finally:
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def escape_query(value):
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
 
 def file_url(item):
     return f"https://drive.usercontent.google.com/uc?export=download&id={item['id']}"
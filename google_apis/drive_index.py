@@ -0,0 +1,46 @@
+from licensing.sqlite_store import SqliteStore
+
+
+class DriveUploadIndex(SqliteStore):
+    """
+    Local SQLite record of the files uploaded to each Drive folder, by name and by md5
+    of their content (Drive's own `md5Checksum`), so publishing the same content again
+    reuses the uploaded file instead of uploading it anew.
+    """
+
+    filename = "drive_uploads.sqlite"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS uploads ("
+        "folder_id TEXT NOT NULL, name TEXT NOT NULL, file_id TEXT NOT NULL, md5 TEXT NOT NULL, "
+        "PRIMARY KEY (folder_id, name))",
+        "CREATE INDEX IF NOT EXISTS uploads_md5 ON uploads (folder_id, md5)",
+    )
+
+    @classmethod
+    def from_config(cls, cache_config):
+        return cls(directory=cache_config.directory)
+
+    def get(self, folder_id, name):
+        """Returns the (file_id, md5) of the file uploaded as `name` in the folder, or None."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT file_id, md5 FROM uploads WHERE folder_id = ? AND name = ?", (folder_id, name)
+            ).fetchone()
+
+    def find(self, folder_id, md5):
+        """Returns the id of a file with this content in the folder, or None."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT file_id FROM uploads WHERE folder_id = ? AND md5 = ?", (folder_id, md5)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, folder_id, name, file_id, md5):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?)", (folder_id, name, file_id, md5)
+            )
+
+    def forget(self, file_id):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM uploads WHERE file_id = ?", (file_id,))
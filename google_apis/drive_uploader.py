@@ -0,0 +1,125 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+from .credentials import get_service
+
+# the most calls Drive accepts in one HTTP batch request
+MAX_BATCH_SIZE = 100
+RETRIED_STATUSES = {429, 500, 502, 503, 504}
+PUBLIC_PERMISSION = {"type": "anyone", "role": "reader"}
+
+
+class DriveUploader:
+    """
+    Uploads files to Drive on a few concurrent threads and makes them public with
+    permission grants grouped into HTTP batch requests. A failed upload or grant is
+    retried on its own with exponential backoff, without redoing the rest.
+    """
+
+    def __init__(self, max_workers=4, batch_size=MAX_BATCH_SIZE, max_attempts=5, backoff=1.0):
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-upload")
+
+    def upload(self, metadata, make_media, fields="id"):
+        """
+        Creates a file, or updates the file `metadata["id"]` in place, with the media returned by `make_media()`.
+        The media is made again for every attempt since a failed upload consumes it.
+        A file to update that no longer exists is created again.
+        """
+        def create():
+            files = get_service("drive", "v3").files()
+            body = {key: value for key, value in metadata.items() if key != "id"}
+            return files.create(body=body, media_body=make_media(), fields=fields).execute()
+
+        def update():
+            files = get_service("drive", "v3").files()
+            body = {key: value for key, value in metadata.items() if key not in ("id", "parents")}
+            return files.update(fileId=metadata["id"], body=body, media_body=make_media(), fields=fields).execute()
+
+        if "id" in metadata:
+            try:
+                return self.with_retries(update)
+            except HttpError as error:
+                if error.resp.status != 404:
+                    raise
+                print(f"{metadata.get('name')} was deleted from Drive, uploading it again")
+        return self.with_retries(create)
+
+    def upload_all(self, uploads, fields="id"):
+        """
+        Uploads the (metadata, make_media) pairs concurrently, and returns the created
+        files in the same order, None for the uploads that failed every attempt.
+        """
+        def upload_or_none(upload):
+            metadata, make_media = upload
+            try:
+                return self.upload(metadata, make_media, fields)
+            except Exception as error:
+                print(f"Failed to upload {metadata.get('name')}: {error}")
+                return None
+        return list(self.executor.map(upload_or_none, uploads))
+
+    def make_public(self, file_ids):
+        """Grants anyone with the link read access to the files, and returns the ids whose grant failed."""
+        pending = list(file_ids)
+        # grants that failed for good, kept across the attempts retrying the others
+        given_up = []
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            failed = []
+            for start in range(0, len(pending), self.batch_size):
+                failed.extend(self.grant_batch(pending[start:start + self.batch_size]))
+            pending = []
+            for file_id, error in failed:
+                if is_retried(error):
+                    pending.append(file_id)
+                else:
+                    print(f"Failed to make {file_id} public: {error}")
+                    given_up.append(file_id)
+            if not pending:
+                break
+        return given_up + pending
+
+    def grant_batch(self, file_ids):
+        """Sends one batch request of permission grants, and returns the (file_id, error) of those that failed."""
+        service = get_service("drive", "v3")
+        failed = []
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                failed.append((request_id, exception))
+
+        batch = service.new_batch_http_request(callback=callback)
+        for file_id in file_ids:
+            batch.add(service.permissions().create(fileId=file_id, body=PUBLIC_PERMISSION), request_id=file_id)
+        try:
+            batch.execute()
+        except Exception as error:
+            # the whole batch request failed, retry every grant in it
+            return [(file_id, error) for file_id in file_ids]
+        return failed
+
+    def with_retries(self, call):
+        for attempt in range(self.max_attempts):
+            try:
+                return call()
+            except Exception as error:
+                if attempt == self.max_attempts - 1 or not is_retried(error):
+                    raise
+                print(f"Drive call failed ({error}), retrying")
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def is_retried(error):
+    if isinstance(error, HttpError):
+        # Drive reports exceeded rate limits as 403 rateLimitExceeded or userRateLimitExceeded
+        return error.resp.status in RETRIED_STATUSES or (
+            error.resp.status == 403 and b"ateLimitExceeded" in (error.content or b"")
+        )
+    return isinstance(error, (ConnectionError, TimeoutError))
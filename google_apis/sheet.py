@@ -1,33 +1,89 @@
-from gspread import authorize
-from gspread.utils import ValueInputOption
+import atexit
+import threading
 from urllib.parse import urlparse
-from .drive import get_drive_service
+from licensing.metrics import metrics
+from .credentials import get_gspread_client
 
 class GoogleSheet:
-    def __init__(self, config, headers):
+    def __init__(self, config, headers, spreadsheet_id=None, next_row=None):
+        """
+        Creates a new spreadsheet, or reopens `spreadsheet_id` to append rows from `next_row` on.
+        """
+        from .drive import get_drive_service
         self.creds, self.service = get_drive_service()
 
-        sheet_metadata = {
-            'name': config.name,
-            'mimeType': 'application/vnd.google-apps.spreadsheet',
-            'parents': [config.folder_id]
-        }
-        file = self.service.files().create(body=sheet_metadata, fields='id').execute()
-        self.spreadsheet_id = file.get('id')
-        self.gc = authorize(self.creds)
+        if spreadsheet_id is None:
+            sheet_metadata = {
+                'name': config.name,
+                'mimeType': 'application/vnd.google-apps.spreadsheet',
+                'parents': [config.folder_id]
+            }
+            file = self.service.files().create(body=sheet_metadata, fields='id').execute()
+            spreadsheet_id = file.get('id')
+        self.spreadsheet_id = spreadsheet_id
+        self.gc = get_gspread_client()
         self.sheet = self.gc.open_by_key(self.spreadsheet_id)
         self.worksheet = self.sheet.get_worksheet(0)
         self.headers = headers
-        self.worksheet.insert_rows(headers)
-        print(f"Google Sheet created at: https://docs.google.com/spreadsheets/d/{self.spreadsheet_id}/edit")
+        if next_row is None:
+            self.worksheet.insert_rows(headers)
+            print(f"Google Sheet created at: https://docs.google.com/spreadsheets/d/{self.spreadsheet_id}/edit")
+        else:
+            print(f"Google Sheet reopened at row {next_row}: https://docs.google.com/spreadsheets/d/{self.spreadsheet_id}/edit")
+
+        # rows are buffered and written in batches, the next free row is tracked locally
+        self.next_row = next_row or len(headers) + 1
+        self.pending_rows = []
+        self.pending_keys = []
+        # called with the keys of the rows and the next free row after every successful write
+        self.on_rows_written = None
+        self.flush_rows = config.flush_rows
+        self.flush_seconds = config.flush_seconds
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        threading.Thread(target=self.flush_periodically, name="sheet-flush", daemon=True).start()
+        atexit.register(self.close)
 
     def freeze_header_rows(self, count=1):
         self.worksheet.freeze(count)
 
-    def append_row(self, row):
-        next_row = len(self.worksheet.get_all_values()) + 1
-        self.worksheet.insert_rows([row], row=next_row, value_input_option=ValueInputOption.user_entered)
-        print(f"Appended row {next_row}")
+    def append_row(self, row, key=None):
+        with metrics.timer("sheet_append_seconds"), self.lock:
+            self.pending_rows.append(row)
+            self.pending_keys.append(key)
+            if len(self.pending_rows) >= self.flush_rows:
+                self.write_pending_rows()
+
+    def flush(self):
+        with self.lock:
+            self.write_pending_rows()
+
+    def write_pending_rows(self):
+        # caller holds the lock, rows stay pending if the write fails so the next flush retries them
+        if not self.pending_rows:
+            return
+        from gspread.utils import ValueInputOption
+        rows, keys = self.pending_rows, self.pending_keys
+        with metrics.timer("sheet_write_seconds"):
+            self.worksheet.insert_rows(rows, row=self.next_row, value_input_option=ValueInputOption.user_entered)
+        metrics.count("sheet_rows_written_total", len(rows))
+        print(f"Appended rows {self.next_row} to {self.next_row + len(rows) - 1}")
+        self.next_row += len(rows)
+        self.pending_rows = []
+        self.pending_keys = []
+        if self.on_rows_written is not None:
+            self.on_rows_written(keys, self.next_row)
+
+    def flush_periodically(self):
+        while not self.closed.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as error:
+                print("Failed to append rows:", error)
+
+    def close(self):
+        self.closed.set()
+        self.flush()
 
 
 def image_link(url):
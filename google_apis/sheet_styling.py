@@ -1,10 +1,10 @@
-from googleapiclient.discovery import build
+from .credentials import get_service
 
 class GoogleSheetStyle:
-    def __init__(self, worksheet_id, spreadsheet_id, creds):
+    def __init__(self, worksheet_id, spreadsheet_id):
         self.worksheet_id = worksheet_id
         self.spreadsheet_id = spreadsheet_id
-        self.service = build('sheets', 'v4', credentials=creds)
+        self.service = get_service('sheets', 'v4')
         self.requests = []
 
     def execute(self):
@@ -1,12 +1,20 @@
-from google.cloud import storage
-from .credentials import get_creds
+from .credentials import get_client, get_creds
+
+
+# only the blob properties used downstream are listed
+LISTING_FIELDS = "items(name,generation,md5Hash,contentType,size),nextPageToken"
 
 
 def get_bucket_blobs(bucket_name, project_name):
-    creds = get_creds()
-    client = storage.Client(credentials=creds, project=project_name)
+    return [blob for blob in iter_bucket_blobs(bucket_name, project_name)]
+
+
+def iter_bucket_blobs(bucket_name, project_name, prefix=None, page_size=1000):
+    """Lazily iterates over the bucket's blobs, fetching one listing page at a time."""
+    from google.cloud import storage
+    client = get_client(("storage", project_name), lambda: storage.Client(credentials=get_creds(), project=project_name))
     bucket = client.bucket(bucket_name)
-    return [blob for blob in bucket.list_blobs()]
+    return bucket.list_blobs(prefix=prefix or None, page_size=page_size, fields=LISTING_FIELDS)
 
 
 def get_gcs_uri(blob):
@@ -1,32 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+from google.api_core import exceptions
+from google.api_core.retry import Retry, if_exception_type
 from google.cloud import vision
 from licensing.image import ImageMatch
-from .credentials import get_creds
+from licensing.metrics import metrics
+from .credentials import get_client, get_creds
 from urllib.parse import urlparse
 
+# the maximum batch size for Google Vision batch annotation is 16
+BATCH_SIZE = 16
+
+# back off exponentially while the project is over its Vision quota
+QUOTA_RETRY = Retry(
+    predicate=if_exception_type(exceptions.ResourceExhausted, exceptions.TooManyRequests, exceptions.ServiceUnavailable),
+    initial=1.0,
+    maximum=60.0,
+    multiplier=2.0,
+    timeout=600.0
+)
+
 
 class Vision:
-    def __init__(self):
+    def __init__(self, response_cache=None, batches_in_flight=1):
         self.creds = get_creds()
-        self.client = vision.ImageAnnotatorClient(credentials=self.creds)
-
-    def batch_search(self, image_set, publish_method):
-        eligible_images = [image for image in image_set.images if image.is_eligible_to_get_more_matches]
-        # the maximum batch size for Google Vision batch annotation is 16
-        image_number = 1
-        for batch in chunk_list(eligible_images, 16):
-            print("Annotating images", image_number, "to", image_number + len(batch) - 1)
-            self.batch_annotate_gcs_images(batch, publish_method)
-            image_number += len(batch)
-
-    def batch_annotate_gcs_images(self, images, publish_method):
-        requests = [make_request(image, image.match_limit) for image in images]
-        response = self.client.batch_annotate_images(requests=requests)
-        for image, response in zip(images, response.responses):
-            for match in image_matches(response):
-                image.add_match(match)
-                if image.has_enough:
-                    break
-            image.publish(publish_method)
+        self.client = get_client("vision", lambda: vision.ImageAnnotatorClient(credentials=self.creds))
+        self.response_cache = response_cache
+        self.executor = ThreadPoolExecutor(max_workers=batches_in_flight, thread_name_prefix="vision")
+
+    def annotate(self, images, max_results):
+        """Returns the web detection responses of `images`, only calling Vision for those not in the cache."""
+        responses = [None] * len(images)
+        if self.response_cache is not None:
+            for i, (image, limit) in enumerate(zip(images, max_results)):
+                responses[i] = self.response_cache.get(image.blob, limit)
+
+        missing = [i for i, response in enumerate(responses) if response is None]
+        metrics.count("vision_images_total", len(images) - len(missing), source="cache")
+        if missing:
+            requests = [make_request(images[i], max_results[i]) for i in missing]
+            metrics.count("vision_images_total", len(missing), source="api")
+            metrics.observe("vision_batch_size", len(missing))
+            with metrics.timer("vision_annotate_seconds"):
+                response = self.client.batch_annotate_images(requests=requests, retry=QUOTA_RETRY)
+            for i, image_response in zip(missing, response.responses):
+                responses[i] = image_response
+                if self.response_cache is not None:
+                    self.response_cache.put(images[i].blob, max_results[i], image_response)
+        return responses
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def new_image_matches(image, response):
+    image.search_rounds += 1
+    image.vision_error = response.error.message or None
+    if image.vision_error:
+        print(f"'{image.name}': Vision error: {image.vision_error}")
+    # Vision returns the results of the previous rounds again, only the new tail becomes matches
+    new_matches = list(image_matches(response, image.seen_page_urls))
+    if not new_matches:
+        image.search_exhausted = True
+    return new_matches
 
 
 def make_request(image, max_results):
@@ -43,27 +78,39 @@ def make_request(image, max_results):
     )
 
 
-def chunk_list(lst, chunk_size):
-    for i in range(0, len(lst), chunk_size):
-        yield lst[i:i+chunk_size]
+def image_matches(response, seen_page_urls=frozenset()):
+    """
+    Yields one match per page url, skipping the page urls in `seen_page_urls`
+    before any match object is created for them.
+    """
+    yielded = set()
 
+    def is_new(url):
+        if url in seen_page_urls or url in yielded:
+            return False
+        yielded.add(url)
+        return True
 
-def image_matches(response):
     web_detection = response.web_detection
     for page in web_detection.pages_with_matching_images:
         for image in page.full_matching_images:
-            yield image_match_from_page(page, image, "full match")
+            if is_new(page.url):
+                yield image_match_from_page(page, image, "full match")
         for image in page.partial_matching_images:
-            yield image_match_from_page(page, image, "partial match")
+            if is_new(page.url):
+                yield image_match_from_page(page, image, "partial match")
 
     for image in web_detection.full_matching_images:
-        yield image_match_from_image(image, "full match")
+        if is_new(image.url):
+            yield image_match_from_image(image, "full match")
 
     for image in web_detection.partial_matching_images:
-        yield image_match_from_image(image, "partial match")
+        if is_new(image.url):
+            yield image_match_from_image(image, "partial match")
 
     for image in web_detection.visually_similar_images:
-        yield image_match_from_image(image, "visually similar")
+        if is_new(image.url):
+            yield image_match_from_image(image, "visually similar")
 
 
 def image_match_from_page(page, image, match_type):
@@ -0,0 +1,75 @@
+import time
+from google.cloud import vision
+from licensing.sqlite_store import SqliteStore
+
+# web detection results that are limited by the requested max_results
+LIMITED_FIELDS = (
+    "web_entities",
+    "full_matching_images",
+    "partial_matching_images",
+    "pages_with_matching_images",
+    "visually_similar_images",
+)
+
+
+class VisionResponseCache(SqliteStore):
+    """
+    Persistent cache of raw web detection responses, keyed by the content of the GCS object
+    (its generation and md5), so unchanged images are never annotated twice.
+    A response stored for `max_results` also answers any request for fewer results.
+    """
+
+    filename = "vision.sqlite"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "blob_key TEXT PRIMARY KEY, max_results INTEGER NOT NULL, "
+        "response BLOB NOT NULL, stored_at REAL NOT NULL)",
+    )
+
+    def __init__(self, directory, ttl_days):
+        super().__init__(directory)
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, cache_config, search_config):
+        return cls(directory=cache_config.directory, ttl_days=search_config.vision_cache_ttl_days)
+
+    def get(self, blob, max_results):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT max_results, response, stored_at FROM responses WHERE blob_key = ?", (blob_key(blob),)
+            ).fetchone()
+            if row is None or row[0] < max_results or time.time() - row[2] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+        response = vision.AnnotateImageResponse.deserialize(row[1])
+        if row[0] > max_results:
+            truncate(response.web_detection, max_results)
+        return response
+
+    def put(self, blob, max_results, response):
+        if response.error.code:
+            return
+        data = vision.AnnotateImageResponse.serialize(response)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (blob_key, max_results, response, stored_at) VALUES (?, ?, ?, ?)",
+                (blob_key(blob), max_results, data, time.time())
+            )
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def blob_key(blob):
+    # a new generation or different content gets a new key, stale entries are simply never read again
+    return f"{blob.bucket.name}/{blob.name}#{blob.generation}:{blob.md5_hash}"
+
+
+def truncate(web_detection, max_results):
+    for field in LIMITED_FIELDS:
+        del getattr(web_detection, field)[max_results:]
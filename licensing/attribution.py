@@ -1,12 +1,9 @@
-import os
 import tldextract
-from config import Configuration
-from google_apis.credentials import get_creds
+from licensing.config import Configuration
+from google_apis.credentials import get_gspread_client
 from google_apis.drive import upload_html_to_drive, upload_html_and_thumbs_to_drive
-from gspread import authorize
-import requests
-from PIL import Image
-from io import BytesIO
+from google_apis.drive_index import DriveUploadIndex
+from licensing.thumbnails import ThumbnailCache
 from urllib.parse import urlparse
 
 HTML_HEADER = '''<!DOCTYPE html>
@@ -106,7 +103,7 @@ def get_domain(url):
     return url  # fallback
 
 
-def generate_attribution_html_with_thumbnails(attributions, thumb_urls, folder_id):
+def generate_attribution_html_with_thumbnails(attributions, thumb_urls, folder_id, upload_index=None):
     html = [HTML_HEADER]
     for i, (attribution, thumb_url) in enumerate(zip(attributions, thumb_urls)):
         if attribution.license_url:
@@ -130,12 +127,11 @@ def generate_attribution_html_with_thumbnails(attributions, thumb_urls, folder_i
               </figure>
         ''')
     html.append(HTML_FOOTER)
-    upload_html_and_thumbs_to_drive(''.join(html), folder_id, thumb_urls)
+    upload_html_and_thumbs_to_drive(''.join(html), folder_id, thumb_urls, upload_index)
 
 
 def get_attributions_from_sheet(sheet_id, worksheet_name):
-    creds = get_creds()
-    gc = authorize(creds)
+    gc = get_gspread_client()
     worksheet = gc.open_by_key(sheet_id).worksheet(worksheet_name)
     rows = worksheet.get_all_values(value_render_option='FORMULA')
 
@@ -180,25 +176,17 @@ def extract_hyperlink(cell_value):
     else:
         return None
 
-THUMB_SIZE = (110, 110)
-
-def download_and_create_thumbnails(attributions, output_dir="thumbnails"):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    thumb_paths = []
-    for idx, attr in enumerate(attributions):
-        thumb_filename = f"thumb_{idx}.jpg"
-        thumb_path = os.path.join(output_dir, thumb_filename)
-        try:
-            resp = requests.get(attr.image_url, timeout=10)
-            resp.raise_for_status()
-            img = Image.open(BytesIO(resp.content)).convert("RGB")
-            img.thumbnail(THUMB_SIZE, Image.LANCZOS)
-            img.save(thumb_path, format="JPEG")
-            thumb_paths.append(thumb_path)
-        except Exception as e:
-            print(f"Failed to process image {attr.image_url}: {e}")
-            thumb_paths.append(None)
+def download_and_create_thumbnails(attributions, output_dir="thumbnails", max_workers=16):
+    """
+    Returns the thumbnail path of each attribution's image, None where it failed.
+    Images are downloaded and resized in parallel, and thumbnails are reused across runs.
+    """
+    thumbnail_cache = ThumbnailCache(output_dir, max_workers)
+    try:
+        thumb_paths = thumbnail_cache.thumbnail_paths([attr.image_url for attr in attributions])
+    finally:
+        thumbnail_cache.close()
+    print("Thumbnail cache:", thumbnail_cache.stats)
     return thumb_paths
 
 
@@ -206,4 +194,6 @@ if __name__ == '__main__':
     config = Configuration.load()
     attributions = get_attributions_from_sheet("1oM8em0WDjOa6AI-9q3Skz2UmFyvPx8VQ_v1VuEC3Xn8", "Sheet1")
     thumb_paths = download_and_create_thumbnails(attributions)
-    generate_attribution_html_with_thumbnails(attributions, thumb_paths, config.spreadsheet.folder_id)
\ No newline at end of file
+    upload_index = DriveUploadIndex.from_config(config.cache)
+    generate_attribution_html_with_thumbnails(attributions, thumb_paths, config.spreadsheet.folder_id, upload_index)
+    upload_index.close()
\ No newline at end of file
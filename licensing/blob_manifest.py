@@ -0,0 +1,53 @@
+import time
+
+from licensing.sqlite_store import SqliteStore
+
+
+class BlobManifest(SqliteStore):
+    """
+    Persistent record of the blobs whose row was published, with the generation and md5
+    they had, so incremental runs only process new or modified objects.
+    """
+
+    filename = "manifest.sqlite"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS blobs ("
+        "bucket TEXT NOT NULL, name TEXT NOT NULL, generation TEXT, md5 TEXT, "
+        "processed_at REAL NOT NULL, PRIMARY KEY (bucket, name))",
+    )
+
+    def __init__(self, directory, bucket):
+        super().__init__(directory)
+        self.bucket = bucket
+        # versions of the blobs listed in this run, recorded once their row is published
+        self.listed = {}
+        self.processed = {
+            name: (generation, md5)
+            for name, generation, md5 in self.connection.execute(
+                "SELECT name, generation, md5 FROM blobs WHERE bucket = ?", (bucket,)
+            )
+        }
+
+    @classmethod
+    def from_config(cls, cache_config, image_config):
+        return cls(directory=cache_config.directory, bucket=image_config.bucket)
+
+    def is_processed(self, blob):
+        return self.processed.get(blob.name) == blob_version(blob)
+
+    def track(self, blob):
+        self.listed[blob.name] = blob_version(blob)
+
+    def mark_processed(self, names):
+        now = time.time()
+        with self.lock, self.connection:
+            versions = [(name, self.listed[name]) for name in names if name in self.listed]
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?)",
+                [(self.bucket, name, generation, md5, now) for name, (generation, md5) in versions]
+            )
+            self.processed.update(versions)
+
+
+def blob_version(blob):
+    return str(blob.generation), blob.md5_hash
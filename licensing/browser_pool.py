@@ -0,0 +1,118 @@
+import atexit
+import threading
+
+
+class BrowserSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+
+class BrowserPool:
+    """
+    Bounded pool of headless Chrome sessions shared by all the page fetches of a run.
+    Sessions are started on first use, recycled after `max_pages` pages or when
+    the browser crashes, and shut down when the pool is closed or at exit.
+    """
+
+    def __init__(self, size=1, max_pages=50, page_timeout=30):
+        self.size = size
+        self.max_pages = max_pages
+        self.page_timeout = page_timeout
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle: list[BrowserSession] = []
+        self.sessions: set[BrowserSession] = set()
+        self.driver_path = None
+        self.closed = False
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, lookup_config):
+        return cls(
+            size=lookup_config.browser_pool_size,
+            max_pages=lookup_config.browser_max_pages,
+            page_timeout=lookup_config.browser_page_timeout
+        )
+
+    def fetch_html(self, page_url):
+        from selenium.common.exceptions import TimeoutException
+
+        with self.slots:
+            session = self.acquire()
+            try:
+                session.driver.get(page_url)
+                html = session.driver.page_source
+            except TimeoutException:
+                self.release(session)
+                raise
+            except Exception:
+                # the browser may have crashed, don't hand this session out again
+                self.discard(session)
+                raise
+            session.pages += 1
+            self.release(session)
+            return html
+
+    def acquire(self):
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("browser pool is closed")
+            if self.idle:
+                return self.idle.pop()
+        session = BrowserSession(self.start_driver())
+        with self.lock:
+            self.sessions.add(session)
+        return session
+
+    def release(self, session):
+        if session.pages >= self.max_pages:
+            self.discard(session)
+            return
+        with self.lock:
+            if not self.closed:
+                self.idle.append(session)
+                return
+        self.discard(session)
+
+    def discard(self, session):
+        with self.lock:
+            self.sessions.discard(session)
+        quit_driver(session.driver)
+
+    def start_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+        from licensing.page_fetcher import USER_AGENT
+
+        with self.lock:
+            # only look up (and possibly download) the driver once per run
+            if self.driver_path is None:
+                self.driver_path = ChromeDriverManager().install()
+
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument(f"user-agent={USER_AGENT}")
+        driver = webdriver.Chrome(options=chrome_options, service=Service(self.driver_path))
+        driver.set_page_load_timeout(self.page_timeout)
+        return driver
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            sessions = list(self.sessions)
+            self.sessions.clear()
+            self.idle.clear()
+        for session in sessions:
+            quit_driver(session.driver)
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception as error:
+        print("Failed to quit browser:", error)
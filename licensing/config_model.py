@@ -1,6 +1,6 @@
 # generated by datamodel-codegen:
 #   filename:  config.json
-#   timestamp: 2025-05-24T07:56:03+00:00
+#   timestamp: 2026-10-18T09:42:56+00:00
 
 from __future__ import annotations
 
@@ -10,11 +10,16 @@ from pydantic import BaseModel
 class Images(BaseModel):
     project: str
     bucket: str
+    prefix: str
+    content_type_prefix: str
+    incremental: bool
 
 
 class Spreadsheet(BaseModel):
     folder_id: str
     name: str
+    flush_rows: int
+    flush_seconds: int
 
 
 class Search(BaseModel):
@@ -22,6 +27,8 @@ class Search(BaseModel):
     max_results_for_creative_commons: int
     max_results_for_url: int
     max_results_for_text: int
+    vision_cache_ttl_days: int
+    vision_batches_in_flight: int
 
 
 class Width(BaseModel):
@@ -40,8 +47,48 @@ class SheetStyle(BaseModel):
     height: int
 
 
+class Cache(BaseModel):
+    directory: str
+
+
+class LicenseLookup(BaseModel):
+    cache_ttl_days: int
+    cache_max_entries: int
+    max_workers: int
+    max_per_domain: int
+    fetch_timeout: int
+    stream_pages: bool
+    max_page_bytes: int
+    browser_pool_size: int
+    browser_max_pages: int
+    browser_page_timeout: int
+    domain_profile_ttl_days: int
+    dead_domain_failures: int
+    dead_domain_retry_hours: int
+    html_extractor: str
+
+
+class Pipeline(BaseModel):
+    queue_size: int
+    ingest_workers: int
+    batch_wait_seconds: float
+
+
+class Sharding(BaseModel):
+    directory: str
+
+
+class Metrics(BaseModel):
+    directory: str
+
+
 class Model(BaseModel):
     images: Images
     spreadsheet: Spreadsheet
     search: Search
     sheet_style: SheetStyle
+    cache: Cache
+    license_lookup: LicenseLookup
+    pipeline: Pipeline
+    sharding: Sharding
+    metrics: Metrics
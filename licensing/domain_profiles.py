@@ -0,0 +1,103 @@
+import time
+
+from licensing.sqlite_store import SqliteStore
+
+LATENCY_SMOOTHING = 0.3
+
+
+class DomainProfile:
+    def __init__(self, domain, needs_browser_at=None, latency=None, failures=0, last_failure=None, last_failure_at=None):
+        self.domain = domain
+        self.needs_browser_at = needs_browser_at
+        self.latency = latency
+        self.failures = failures
+        self.last_failure = last_failure
+        self.last_failure_at = last_failure_at
+
+    @property
+    def values(self):
+        return (self.domain, self.needs_browser_at, self.latency, self.failures, self.last_failure, self.last_failure_at)
+
+
+class DomainProfiles(SqliteStore):
+    """
+    Persistent per-domain fetch history: whether the domain refuses plain http
+    requests and needs the browser, its typical latency and its last failure.
+    Domains that keep failing are reported as dead for a while so their pages can be skipped.
+    """
+
+    filename = "domains.sqlite"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS domains ("
+        "domain TEXT PRIMARY KEY, needs_browser_at REAL, latency REAL, "
+        "failures INTEGER NOT NULL, last_failure TEXT, last_failure_at REAL)",
+    )
+
+    def __init__(self, directory, ttl_days, dead_after_failures, dead_retry_hours):
+        super().__init__(directory)
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.dead_after_failures = dead_after_failures
+        self.dead_retry = dead_retry_hours * 60 * 60
+        self.profiles = {
+            row[0]: DomainProfile(*row)
+            for row in self.connection.execute("SELECT * FROM domains")
+        }
+
+    @classmethod
+    def from_config(cls, cache_config, lookup_config):
+        return cls(
+            directory=cache_config.directory,
+            ttl_days=lookup_config.domain_profile_ttl_days,
+            dead_after_failures=lookup_config.dead_domain_failures,
+            dead_retry_hours=lookup_config.dead_domain_retry_hours
+        )
+
+    def needs_browser(self, domain):
+        profile = self.profiles.get(domain)
+        # after a while, give plain http another chance in case the site changed its policy
+        return bool(profile and profile.needs_browser_at and time.time() - profile.needs_browser_at < self.ttl)
+
+    def dead_reason(self, domain):
+        """Returns the last failure of a domain that is considered dead, None otherwise."""
+        profile = self.profiles.get(domain)
+        if (profile and profile.failures >= self.dead_after_failures
+                and time.time() - profile.last_failure_at < self.dead_retry):
+            return profile.last_failure
+        return None
+
+    def record_forbidden(self, domain):
+        with self.lock:
+            profile = self.profile(domain)
+            profile.needs_browser_at = time.time()
+            self.save(profile)
+
+    def record_success(self, domain, elapsed, with_browser=False):
+        with self.lock:
+            profile = self.profile(domain)
+            if profile.latency is None:
+                profile.latency = elapsed
+            else:
+                profile.latency += LATENCY_SMOOTHING * (elapsed - profile.latency)
+            profile.failures = 0
+            if not with_browser:
+                profile.needs_browser_at = None
+            self.save(profile)
+
+    def record_failure(self, domain, error):
+        with self.lock:
+            profile = self.profile(domain)
+            profile.failures += 1
+            profile.last_failure = str(error)[:500]
+            profile.last_failure_at = time.time()
+            self.save(profile)
+
+    def profile(self, domain):
+        # caller holds the lock
+        if domain not in self.profiles:
+            self.profiles[domain] = DomainProfile(domain)
+        return self.profiles[domain]
+
+    def save(self, profile):
+        # caller holds the lock
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO domains VALUES (?, ?, ?, ?, ?, ?)", profile.values)
@@ -1,12 +1,22 @@
+from bisect import insort
 from google_apis.sheet import image_link
-from google_apis.storage import get_bucket_blobs
-from licensing.license import License
+from google_apis.storage import get_bucket_blobs, iter_bucket_blobs
 
 
 class Image:
     def __init__(self, blob, search_config):
         self.blob = blob
         self.matches: list[ImageMatch] = []
+        # kept up to date by add_match, so the license checks don't rescan the matches
+        self.ranked_matches: list[ImageMatch] = []
+        self.creative_commons_count = 0
+        self.license_url_count = 0
+        self.license_text_count = 0
+        self.seen_page_urls: set[str] = set()
+        self.search_rounds = 0
+        self.search_exhausted = False
+        # the error of the last Vision response, whose results may be missing
+        self.vision_error = None
         self.search_config = search_config
 
     @property
@@ -18,15 +28,19 @@ class Image:
         return self.blob.name
 
     def add_match(self, match):
-        if match.page_url in [m.page_url for m in self.matches]:
-            return
+        """Adds a match whose license is already resolved."""
         match.matching_index = len(self.matches)
-        match.add_license()
         self.matches.append(match)
+        self.seen_page_urls.add(match.page_url)
+        self.creative_commons_count += match.license.is_creative_commons_license
+        self.license_url_count += match.has_license_url
+        self.license_text_count += match.has_license_text
+        # ties keep the order the matches were added in, like a stable sort
+        insort(self.ranked_matches, match, key=lambda m: (m.sort_key, m.matching_index))
 
     @property
     def has_creative_commons_license(self):
-        return any(m.license.is_creative_commons_license for m in self.matches)
+        return self.creative_commons_count > 0
 
     @property
     def has_enough(self):
@@ -34,14 +48,17 @@ class Image:
 
     @property
     def has_license_url(self):
-        return any(m.has_license_url for m in self.matches)
+        return self.license_url_count > 0
 
     @property
     def has_license_text(self):
-        return any(m.has_license_text for m in self.matches)
+        return self.license_text_count > 0
 
     @property
     def is_eligible_to_get_more_matches(self):
+        # once a round brings no new matches, asking Vision for more results won't either
+        if self.search_exhausted:
+            return False
         return ((not self.has_license_text and len(self.matches) < self.search_config.max_results_for_text) or
                 (not self.has_license_url and len(self.matches) < self.search_config.max_results_for_url) or
                 (not self.has_creative_commons_license and len(self.matches) < self.search_config.max_results_for_creative_commons))
@@ -54,7 +71,7 @@ class Image:
 
     @property
     def sorted_matches(self):
-        return sorted(self.matches, key=lambda m: m.sort_key)
+        return self.ranked_matches
 
     def publish(self, publish_method):
         if not self.is_eligible_to_get_more_matches:
@@ -74,8 +91,8 @@ class ImageMatch:
         self.matching_index = None
         self.license = None
 
-    def add_license(self):
-        self.license = License.extract_page_license_metadata(self.page_url)
+    def add_license(self, license):
+        self.license = license
         if self.license.is_creative_commons_license:
             print(f"Found CC license for {self.page_url}: {self.license.url}")
         elif self.license.url:
@@ -105,9 +122,28 @@ class ImageSet:
         self.images = images
 
     @classmethod
-    def from_bucket(cls, image_config, search_config):
+    def from_bucket(cls, image_config, search_config, shard=None):
         blobs = get_bucket_blobs(image_config.bucket, image_config.project)
-        return cls([Image(blob, search_config) for blob in blobs])
-
-    def has_unprocessed_images(self):
-        any(i for i in self.images if i.is_eligible_to_get_more_matches)
\ No newline at end of file
+        return cls([Image(blob, search_config) for blob in blobs if shard is None or blob.name in shard])
+
+    @staticmethod
+    def stream_bucket(image_config, search_config, manifest=None, shard=None):
+        """
+        Yields the bucket's images while the bucket listing is paged in, filtered by prefix,
+        content type and, given a `shard`, to the blobs of that shard. In incremental mode,
+        blobs already processed in their current version according to the `manifest` are skipped.
+        """
+        skipped = 0
+        for blob in iter_bucket_blobs(image_config.bucket, image_config.project, image_config.prefix):
+            if not (blob.content_type or "").startswith(image_config.content_type_prefix):
+                continue
+            if shard is not None and blob.name not in shard:
+                continue
+            if manifest is not None:
+                if image_config.incremental and manifest.is_processed(blob):
+                    skipped += 1
+                    continue
+                manifest.track(blob)
+            yield Image(blob, search_config)
+        if skipped:
+            print(f"Skipped {skipped} images already processed in an earlier run")
\ No newline at end of file
@@ -0,0 +1,126 @@
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+from licensing.license import License
+from licensing.sqlite_store import SqliteStore
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class LicenseCache(SqliteStore):
+    """
+    Persistent SQLite cache of `License` lookups keyed by normalized page url,
+    so that repeated runs over the same bucket don't re-download the same pages.
+    Entries expire after `ttl_days`, and the least recently used entries are
+    evicted once the cache holds more than `max_entries`.
+    """
+
+    filename = "licenses.sqlite"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS licenses ("
+        "page_url TEXT PRIMARY KEY, text TEXT, error TEXT, url TEXT, "
+        "stored_at REAL NOT NULL, used_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS licenses_used_at ON licenses (used_at)",
+    )
+
+    def __init__(self, directory, ttl_days, max_entries):
+        super().__init__(directory)
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = self.connection.execute("SELECT COUNT(*) FROM licenses").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, cache_config, lookup_config):
+        return cls(
+            directory=cache_config.directory,
+            ttl_days=lookup_config.cache_ttl_days,
+            max_entries=lookup_config.cache_max_entries
+        )
+
+    def get(self, page_url):
+        key = normalize_url(page_url)
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT text, error, url, stored_at FROM licenses WHERE page_url = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            text, error, url, stored_at = row
+            if now - stored_at > self.ttl:
+                self.connection.execute("DELETE FROM licenses WHERE page_url = ?", (key,))
+                self.size -= 1
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE licenses SET used_at = ? WHERE page_url = ?", (now, key))
+            self.hits += 1
+            return License(text, error, url)
+
+    def put(self, page_url, license):
+        if not license.is_cacheable:
+            return
+        key = normalize_url(page_url)
+        now = time.time()
+        with self.lock, self.connection:
+            exists = self.connection.execute("SELECT 1 FROM licenses WHERE page_url = ?", (key,)).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO licenses (page_url, text, error, url, stored_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, license.text, license.error, license.url, now, now)
+            )
+            if not exists:
+                self.size += 1
+            if self.size > self.max_entries:
+                self.evict(self.size - self.max_entries)
+
+    def evict(self, count):
+        # caller holds the lock and the transaction
+        self.connection.execute(
+            "DELETE FROM licenses WHERE page_url IN "
+            "(SELECT page_url FROM licenses ORDER BY used_at LIMIT ?)",
+            (count,)
+        )
+        self.size -= count
+        self.evictions += count
+
+    def get_or_extract(self, page_url, extract):
+        if page_url is None:
+            return extract(page_url)
+        try:
+            license = self.get(page_url)
+        except ValueError:
+            # a malformed url can't be normalized into a cache key, its fetch reports the error
+            return extract(page_url)
+        if license is None:
+            license = extract(page_url)
+            self.put(page_url, license)
+        return license
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": self.size,
+        }
+
+
+def normalize_url(url):
+    """
+    Normalizes the parts of a url that don't change the page it points to:
+    scheme and host case, default ports and fragments.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname or ""
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    path = parts.path or "/"
+    return urlunsplit((scheme, netloc, path, parts.query, ""))
@@ -0,0 +1,134 @@
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+from licensing.license import License
+from licensing.metadata_extractors import get_extractor
+from licensing.page_fetcher import page_domain
+
+
+class LicenseResolver:
+    """
+    Fetches page licenses on a thread pool. `max_workers` bounds the number of
+    pages fetched at once overall, `max_per_domain` the number fetched at once
+    from any single host. Pages wait in a queue per host until their host has a
+    free slot, so workers never sit blocked behind a busy host.
+    """
+
+    def __init__(self, max_workers, max_per_domain, license_cache=None, page_fetcher=None, extractor=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="license")
+        self.max_per_domain = max_per_domain
+        self.license_cache = license_cache
+        self.page_fetcher = page_fetcher
+        self.extractor = extractor
+        # pages waiting for a slot and pages being fetched, by domain
+        self.waiting = {}
+        self.fetching = {}
+        self.dispatched = set()
+        self.closed = False
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, lookup_config, license_cache=None, page_fetcher=None):
+        return cls(
+            max_workers=lookup_config.max_workers,
+            max_per_domain=lookup_config.max_per_domain,
+            license_cache=license_cache,
+            page_fetcher=page_fetcher,
+            extractor=get_extractor(lookup_config.html_extractor)
+        )
+
+    def extract(self, page_url):
+        return License.extract_page_license_metadata(page_url, fetcher=self.page_fetcher, extractor=self.extractor)
+
+    def lookup(self, page_url):
+        if self.license_cache is None:
+            return self.extract(page_url)
+        return self.license_cache.get_or_extract(page_url, self.extract)
+
+    def submit(self, matches):
+        futures = []
+        for match in matches:
+            future = Future()
+            futures.append(future)
+            domain = url_domain(match.page_url)
+            with self.lock:
+                self.waiting.setdefault(domain, deque()).append((match.page_url, future))
+            self.dispatch(domain)
+        return Resolutions(matches, futures)
+
+    def dispatch(self, domain):
+        """Sends the domain's waiting pages to the pool while the domain has free slots."""
+        while True:
+            with self.lock:
+                waiting = self.waiting.get(domain)
+                if self.closed or not waiting or self.fetching.get(domain, 0) >= self.max_per_domain:
+                    if waiting is not None and not waiting:
+                        del self.waiting[domain]
+                    return
+                page_url, future = waiting.popleft()
+                # resolutions cancelled while waiting are never fetched
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.fetching[domain] = self.fetching.get(domain, 0) + 1
+                self.dispatched.add(future)
+            self.executor.submit(self.resolve, domain, page_url, future)
+
+    def resolve(self, domain, page_url, future):
+        try:
+            future.set_result(self.lookup(page_url))
+        except BaseException as error:
+            future.set_exception(error)
+        finally:
+            with self.lock:
+                self.dispatched.discard(future)
+                self.fetching[domain] -= 1
+                if not self.fetching[domain]:
+                    del self.fetching[domain]
+            self.dispatch(domain)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            waiting = [future for queued in self.waiting.values() for _, future in queued]
+            self.waiting.clear()
+        for future in waiting:
+            future.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        # pages dispatched but dropped by the pool shutdown never got a result
+        with self.lock:
+            dropped, self.dispatched = self.dispatched, set()
+        for future in dropped:
+            if not future.done():
+                future.set_exception(CancelledError("The license resolver was closed"))
+
+
+def url_domain(page_url):
+    """The domain whose slots the page's fetch takes, malformed and missing urls share one."""
+    if page_url is None:
+        return None
+    try:
+        return page_domain(page_url)
+    except ValueError:
+        return None
+
+
+class Resolutions:
+    """
+    Matches whose licenses are being fetched concurrently. Iterating yields the
+    matches in their original order, each one as soon as its license is known.
+    """
+
+    def __init__(self, matches, futures):
+        self.matches = matches
+        self.futures = futures
+
+    def __iter__(self):
+        for match, future in zip(self.matches, self.futures):
+            match.add_license(future.result())
+            yield match
+
+    def cancel(self):
+        # matches that are already being fetched complete, the others are never started
+        for future in self.futures:
+            future.cancel()
@@ -0,0 +1,269 @@
+import json
+import re
+from html.parser import HTMLParser
+
+META_NAME_TERMS = ["license", "copyright", "rights", "og:copyright", "og:license", "dc.rights", "dc.license", "cc:license"]
+CONTENT_KEYWORDS = ["license", "creativecommons", "cc-", "public domain", "usage rights"]
+TEXT_KEYWORDS = ["license", "creativecommons", "cc-", "public domain", "usage rights"]
+TEXT_KEYWORD_PATTERN = re.compile("|".join(re.escape(keyword) for keyword in TEXT_KEYWORDS))
+MAX_SENTENCE_CHARS = 500
+ALT_KEYWORDS = ["license", "cc", "copyright"]
+ALT_TAGS = ("img", "figure", "figcaption", "span", "div")
+
+
+class SoupExtractor:
+    """
+    Reference implementation: builds a BeautifulSoup tree and queries it once per kind of license signal.
+    """
+
+    def extract(self, html, page_url, debug=False):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'html.parser')
+        meta_info = {}
+
+        # --- Existing meta parsing ---
+        meta_tags = soup.find_all("meta")
+        for tag in meta_tags:
+            attrs = tag.attrs
+            for key in ("name", "property", "itemprop", "rel"):
+                v = attrs.get(key, "").lower()
+                if any(term in v for term in META_NAME_TERMS):
+                    content = attrs.get("content", attrs.get("value", ""))
+                    if content:
+                        meta_info[v] = content
+            # Also search content for keywords
+            for keyword in CONTENT_KEYWORDS:
+                content = attrs.get("content", "").lower()
+                if keyword in content:
+                    meta_info[f"meta:contains:{keyword}"] = content
+
+        # <link rel="license" href=...>
+        link_tags = soup.find_all("link", rel=True, href=True)
+        for link_tag in link_tags:
+            rel = link_tag.get("rel")
+            if isinstance(rel, list):
+                rel = " ".join(rel)
+            if "license" in rel.lower():
+                meta_info["link:license"] = link_tag["href"]
+
+        # <a rel="license" href=...>
+        a_tags = soup.find_all("a", rel=True, href=True)
+        for a_tag in a_tags:
+            rel = a_tag.get("rel")
+            if isinstance(rel, list):
+                rel = " ".join(rel)
+            if "license" in rel.lower():
+                meta_info["a:license"] = a_tag["href"]
+
+        # Structured data (JSON-LD)
+        json_ld_tags = soup.find_all("script", type="application/ld+json")
+        for script in json_ld_tags:
+            try:
+                data = json.loads(script.string)
+                if isinstance(data, dict) and "license" in data:
+                    meta_info["schema:license"] = data["license"]
+            except json.JSONDecodeError as error:
+                print("JSONDecodeError:", error, "decoding json_ld_tags for", page_url)
+                continue
+
+        # Visible text scan
+        text = soup.get_text(separator=' ').lower()
+        meta_info.update(text_metadata(text))
+
+        # Figure/image alt/title/caption
+        other_tags = soup.find_all(list(ALT_TAGS))
+        for tag in other_tags:
+            alt = tag.get("alt", "") or tag.get("title", "")
+            if alt and any(k in alt.lower() for k in ALT_KEYWORDS):
+                meta_info[f"{tag.name}:alt_or_title"] = alt
+
+        if debug and not meta_info:
+            from pprint import pprint
+            print(f"\nurl: {page_url}")
+            pprint(meta_tags)
+            pprint(link_tags)
+            pprint(a_tags)
+            pprint(json_ld_tags)
+            pprint(text)
+            pprint(other_tags)
+
+        return meta_info
+
+
+class ScanExtractor:
+    """
+    Collects every license signal in a single pass of the stdlib html tokenizer,
+    without building a document tree. Returns the same keys, in the same order, as `SoupExtractor`.
+    """
+
+    def extract(self, html, page_url, debug=False):
+        scanner = MetadataScanner(page_url)
+        scanner.feed(html)
+        scanner.close()
+        text = " ".join(scanner.text).lower()
+
+        # merge in the same order as the reference implementation's successive passes
+        meta_info = scanner.meta
+        meta_info.update(scanner.links)
+        meta_info.update(scanner.anchors)
+        meta_info.update(scanner.schema)
+        meta_info.update(text_metadata(text))
+        meta_info.update(scanner.alts)
+
+        if debug and not meta_info:
+            from pprint import pprint
+            print(f"\nurl: {page_url}")
+            pprint(text)
+
+        return meta_info
+
+
+class MetadataScanner(HTMLParser):
+    # text inside these tags is not part of the visible text
+    HIDDEN_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+    PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+
+    def __init__(self, page_url):
+        super().__init__(convert_charrefs=True)
+        self.page_url = page_url
+        self.meta = {}
+        self.links = {}
+        self.anchors = {}
+        self.schema = {}
+        self.alts = {}
+        self.text = []
+        self.pending_text = []
+        self.hidden_depth = 0
+        self.preserve_depth = 0
+        self.in_json_ld = False
+
+    def handle_starttag(self, tag, attrs):
+        self.flush_text()
+        attrs = {key: value or "" for key, value in attrs}
+        if tag == "meta":
+            self.scan_meta(attrs)
+        elif tag == "link" or tag == "a":
+            if "rel" in attrs and "href" in attrs and "license" in " ".join(attrs["rel"].split()).lower():
+                target = self.links if tag == "link" else self.anchors
+                target[f"{tag}:license"] = attrs["href"]
+        elif tag == "script" and attrs.get("type") == "application/ld+json":
+            self.in_json_ld = True
+        if tag in ALT_TAGS:
+            alt = attrs.get("alt", "") or attrs.get("title", "")
+            if alt and any(k in alt.lower() for k in ALT_KEYWORDS):
+                self.alts[f"{tag}:alt_or_title"] = alt
+        if tag in self.HIDDEN_TEXT_TAGS:
+            self.hidden_depth += 1
+        elif tag in self.PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.in_json_ld and tag == "script":
+            self.scan_json_ld("".join(self.pending_text))
+            self.pending_text = []
+            self.in_json_ld = False
+        self.flush_text()
+        if tag in self.HIDDEN_TEXT_TAGS:
+            self.hidden_depth = max(0, self.hidden_depth - 1)
+        elif tag in self.PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth = max(0, self.preserve_depth - 1)
+
+    def handle_data(self, data):
+        self.pending_text.append(data)
+
+    def handle_comment(self, data):
+        self.flush_text()
+
+    def handle_decl(self, decl):
+        self.flush_text()
+
+    def handle_pi(self, data):
+        self.flush_text()
+
+    def unknown_decl(self, data):
+        self.flush_text()
+        if data.startswith("CDATA["):
+            self.pending_text.append(data[len("CDATA["):])
+            self.flush_text()
+
+    def close(self):
+        super().close()
+        self.flush_text()
+
+    def flush_text(self):
+        if not self.pending_text:
+            return
+        text = "".join(self.pending_text)
+        self.pending_text = []
+        if self.hidden_depth or not text:
+            return
+        if not self.preserve_depth and not text.strip(" \t\n\r\f"):
+            # whitespace between tags collapses to a single character, like in BeautifulSoup
+            text = "\n" if "\n" in text else " "
+        self.text.append(text)
+
+    def scan_meta(self, attrs):
+        for key in ("name", "property", "itemprop", "rel"):
+            v = attrs.get(key, "").lower()
+            if any(term in v for term in META_NAME_TERMS):
+                content = attrs.get("content", attrs.get("value", ""))
+                if content:
+                    self.meta[v] = content
+        content = attrs.get("content", "").lower()
+        for keyword in CONTENT_KEYWORDS:
+            if keyword in content:
+                self.meta[f"meta:contains:{keyword}"] = content
+
+    def scan_json_ld(self, script):
+        if not script:
+            return
+        try:
+            data = json.loads(script)
+        except json.JSONDecodeError as error:
+            print("JSONDecodeError:", error, "decoding json_ld_tags for", self.page_url)
+            return
+        if isinstance(data, dict) and "license" in data:
+            self.schema["schema:license"] = data["license"]
+
+
+def text_metadata(text):
+    """
+    Finds, for each keyword, the last period-terminated sentence of `text` that contains it.
+    All keywords are matched in a single linear pass, and sentences are clipped to
+    `MAX_SENTENCE_CHARS` on each side of the keyword so long runs without periods stay cheap.
+    """
+    last_period = text.rfind(".")
+    sentences = {}
+    sentence_ends = {}
+    for match in TEXT_KEYWORD_PATTERN.finditer(text, 0, last_period):
+        keyword = match.group()
+        keyword_start, keyword_end = match.span()
+        if keyword_start < sentence_ends.get(keyword, 0):
+            # same sentence as the previous occurrence of this keyword
+            continue
+        window_start = max(0, keyword_start - MAX_SENTENCE_CHARS)
+        window_end = keyword_end + MAX_SENTENCE_CHARS
+        start = text.rfind(".", window_start, keyword_start) + 1 or window_start
+        end = text.find(".", keyword_end, window_end)
+        end = window_end if end == -1 else end + 1
+        sentences[keyword] = text[start:end].strip()
+        sentence_ends[keyword] = end
+    return {f"text:{keyword}": sentences[keyword] for keyword in TEXT_KEYWORDS if keyword in sentences}
+
+
+EXTRACTORS = {
+    "soup": SoupExtractor(),
+    "scan": ScanExtractor(),
+}
+
+DEFAULT_EXTRACTOR = "scan"
+
+
+def get_extractor(name=DEFAULT_EXTRACTOR):
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown html extractor '{name}', expected one of {list(EXTRACTORS)}")
+    return EXTRACTORS[name]
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "licensing_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS = {
+    "vision_batch_size": (1, 2, 4, 8, 12, 16),
+    "html_parse_cpu_seconds": (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+}
+HELP = {
+    "vision_annotate_seconds": "Latency of Vision batch annotation calls.",
+    "vision_batch_size": "Images per Vision batch annotation call.",
+    "vision_images_total": "Images annotated, by source of the response.",
+    "page_fetch_seconds": "Page fetch time, by outcome.",
+    "page_fetches_total": "Page fetches, by domain and outcome.",
+    "page_fetch_domain_seconds_total": "Time spent fetching pages, by domain and outcome.",
+    "html_parse_cpu_seconds": "CPU time of license metadata extraction from page html, by extractor.",
+    "sheet_append_seconds": "Latency of appending a row to the sheet, including the batch writes it triggers.",
+    "sheet_write_seconds": "Latency of writing a batch of rows to the sheet.",
+    "sheet_rows_written_total": "Rows written to the sheet.",
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "buckets": dict(zip(map(str, self.buckets), self.bucket_counts)),
+        }
+
+
+class Metrics:
+    """
+    Counters and histograms of a run, keyed by metric name and labels, exported as
+    a JSON run summary and a Prometheus textfile. Safe to update from any thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(BUCKETS.get(name, LATENCY_BUCKETS))
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, clock=time.perf_counter, **labels):
+        """Observes the time the block took, wall time by default or e.g. `time.thread_time` for CPU time."""
+        start = clock()
+        try:
+            yield
+        finally:
+            self.observe(name, clock() - start, **labels)
+
+    def summary(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": round(value, 6)}
+                    for (name, labels), value in counters
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.summary()}
+                    for (name, labels), histogram in histograms
+                ],
+            }
+
+    def prometheus_text(self):
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                describe(name, "counter")
+                lines.append(f"{PREFIX}{name}{label_text(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                describe(name, "histogram")
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    lines.append(f"{PREFIX}{name}_bucket{label_text(labels + (('le', str(bound)),))} {count}")
+                lines.append(f"{PREFIX}{name}_bucket{label_text(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{PREFIX}{name}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{PREFIX}{name}_count{label_text(labels)} {histogram.count}")
+        lines.append(f"{PREFIX}run_duration_seconds {time.time() - self.started_at}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory):
+        """Writes `run_summary.json` and the `licensing.prom` textfile to the directory."""
+        os.makedirs(directory, exist_ok=True)
+        write_atomically(os.path.join(directory, "run_summary.json"), json.dumps(self.summary(), indent=2) + "\n")
+        write_atomically(os.path.join(directory, "licensing.prom"), self.prometheus_text())
+
+
+def label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in labels) + "}"
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_atomically(path, text):
+    # the textfile collector may read at any time, it must never see a partial file
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        f.write(text)
+    os.replace(temporary_path, path)
+
+
+# the metrics of the current run, shared by every stage
+metrics = Metrics()
@@ -0,0 +1,179 @@
+import re
+import threading
+import time
+import requests
+from urllib.parse import urlparse
+from licensing.browser_pool import BrowserPool
+from licensing.metrics import metrics
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/123.0.0.0 Safari/537.36"
+)
+
+# Adding a real user agent header helps websites accept the page download query
+HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8"
+}
+
+HEAD_END = re.compile(rb"</head\s*>", re.IGNORECASE)
+
+
+# shared by the lookups that aren't given a fetcher, created on first use
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+
+class BrowserFetchError(Exception):
+    pass
+
+
+class DomainSkipped(Exception):
+    pass
+
+
+class PageFetcher:
+    """
+    Downloads page html. In streaming mode the body is read in chunks up to
+    `max_page_bytes`, and the download stops as soon as the `<head>` section
+    alone is enough for the caller.
+    When `domain_profiles` are provided, domains known to refuse plain http requests
+    go straight to the browser, and domains known to be dead are skipped.
+    """
+
+    def __init__(self, timeout=10, stream=True, max_page_bytes=2_000_000, chunk_size=16 * 1024,
+                 browser_pool=None, domain_profiles=None):
+        self.timeout = timeout
+        self.stream = stream
+        self.max_page_bytes = max_page_bytes
+        self.chunk_size = chunk_size
+        self.browser_pool = browser_pool or BrowserPool()
+        self.domain_profiles = domain_profiles
+
+    @classmethod
+    def from_config(cls, lookup_config, domain_profiles=None):
+        return cls(
+            timeout=lookup_config.fetch_timeout,
+            stream=lookup_config.stream_pages,
+            max_page_bytes=lookup_config.max_page_bytes,
+            browser_pool=BrowserPool.from_config(lookup_config),
+            domain_profiles=domain_profiles
+        )
+
+    def fetch(self, page_url, head_is_enough=None):
+        """
+        Returns the page html, using plain http or the browser depending on what the domain needs.
+        Raises `BrowserFetchError` when the browser fails and `DomainSkipped` for dead domains.
+        """
+        domain = page_domain(page_url)
+        start = time.monotonic()
+        outcome = "error"
+        try:
+            html, outcome = self.fetch_page(page_url, domain, head_is_enough)
+            return html
+        except DomainSkipped:
+            outcome = "skipped"
+            raise
+        except requests.Timeout:
+            outcome = "timeout"
+            raise
+        except BrowserFetchError:
+            outcome = "browser_error"
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            metrics.observe("page_fetch_seconds", elapsed, outcome=outcome)
+            metrics.count("page_fetches_total", domain=domain, outcome=outcome)
+            metrics.count("page_fetch_domain_seconds_total", elapsed, domain=domain, outcome=outcome)
+
+    def fetch_page(self, page_url, domain, head_is_enough):
+        """Returns the page html and how it was fetched: "http", "browser" or "forbidden_browser" after a 403."""
+        profiles = self.domain_profiles
+        if profiles is not None:
+            dead_reason = profiles.dead_reason(domain)
+            if dead_reason is not None:
+                raise DomainSkipped(f"{domain} keeps failing: {dead_reason}")
+            if profiles.needs_browser(domain):
+                return self.fetch_with_browser(page_url, domain), "browser"
+
+        start = time.monotonic()
+        try:
+            html = self.fetch_html(page_url, head_is_enough)
+        except requests.HTTPError as http_err:
+            if http_err.response is None or http_err.response.status_code != 403:
+                raise
+            print("403 Forbidden → fallback to Selenium")
+            if profiles is not None:
+                profiles.record_forbidden(domain)
+            return self.fetch_with_browser(page_url, domain), "forbidden_browser"
+        except (requests.ConnectionError, requests.Timeout) as error:
+            if profiles is not None:
+                profiles.record_failure(domain, error)
+            raise
+        if profiles is not None:
+            profiles.record_success(domain, time.monotonic() - start)
+        return html, "http"
+
+    def fetch_with_browser(self, page_url, domain):
+        start = time.monotonic()
+        try:
+            html = self.browser_pool.fetch_html(page_url)
+        except Exception as error:
+            if self.domain_profiles is not None:
+                self.domain_profiles.record_failure(domain, error)
+            raise BrowserFetchError(error) from error
+        if self.domain_profiles is not None:
+            self.domain_profiles.record_success(domain, time.monotonic() - start, with_browser=True)
+        return html
+
+    def fetch_html(self, page_url, head_is_enough=None):
+        """
+        Returns the page html, or only its head section when `head_is_enough(head_html)` is true.
+        Raises `requests.HTTPError` on error status codes, including 403.
+        """
+        with requests.get(page_url, headers=HEADERS, timeout=self.timeout, stream=self.stream) as response:
+            if response.status_code == 403:
+                raise requests.HTTPError("403 Forbidden", response=response)
+            response.raise_for_status()
+            if not self.stream:
+                return response.text
+            return self.read_streamed(response, head_is_enough)
+
+    def read_streamed(self, response, head_is_enough):
+        encoding = response.encoding or "utf-8"
+        body = bytearray()
+        head_checked = head_is_enough is None
+        for chunk in response.iter_content(self.chunk_size):
+            # only look for the end of the head in the new chunk, plus enough overlap for a split tag
+            search_start = max(0, len(body) - 8)
+            body += chunk
+            if not head_checked:
+                head_end = HEAD_END.search(body, search_start)
+                if head_end:
+                    head_checked = True
+                    head = body[:head_end.end()].decode(encoding, errors="replace")
+                    if head_is_enough(head):
+                        return head
+            if len(body) >= self.max_page_bytes:
+                del body[self.max_page_bytes:]
+                break
+        return body.decode(encoding, errors="replace")
+
+    def close(self):
+        self.browser_pool.close()
+
+
+def default_page_fetcher():
+    """Returns the process-wide fetcher, so lookups without their own fetcher still share one browser pool."""
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            _default_fetcher = PageFetcher()
+        return _default_fetcher
+
+
+def page_domain(page_url):
+    return urlparse(page_url).netloc.lower()
@@ -0,0 +1,218 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from google_apis.vision import BATCH_SIZE, new_image_matches
+
+POLL_INTERVAL = 0.2
+
+
+class Pipeline:
+    """
+    Streams images through the stages of a run:
+
+        blob listing → Vision annotation → license resolution → row publishing
+
+    Stages run on their own threads and are connected by bounded queues, so a slow
+    stage applies back-pressure instead of holding up a whole round. An image that
+    is still eligible for more matches after license resolution goes back to the
+    Vision stage on its own, ahead of images that haven't been annotated yet.
+    """
+
+    def __init__(self, vision, license_resolver, publish_method,
+                 batches_in_flight=1, queue_size=64, ingest_workers=16, batch_wait=1.0, journal=None):
+        self.vision = vision
+        self.license_resolver = license_resolver
+        self.publish_method = publish_method
+        self.journal = journal
+        self.batch_wait = batch_wait
+
+        self.annotate_queue = queue.Queue(queue_size)
+        # re-entering images are already counted in the pipeline, an unbounded queue can't deadlock the cycle
+        self.reannotate_queue = queue.SimpleQueue()
+        self.resolve_queue = queue.Queue(queue_size)
+        self.publish_queue = queue.Queue(queue_size)
+
+        self.vision_slots = threading.BoundedSemaphore(batches_in_flight)
+        self.ingest_slots = threading.BoundedSemaphore(ingest_workers * 2)
+        self.ingest_executor = ThreadPoolExecutor(max_workers=ingest_workers, thread_name_prefix="ingest")
+
+        self.lock = threading.Lock()
+        self.in_pipeline = 0
+        self.listing_done = False
+        self.done = threading.Event()
+        self.error = None
+
+    @classmethod
+    def from_config(cls, pipeline_config, search_config, vision, license_resolver, publish_method, journal=None):
+        return cls(
+            vision, license_resolver, publish_method,
+            batches_in_flight=search_config.vision_batches_in_flight,
+            queue_size=pipeline_config.queue_size,
+            ingest_workers=pipeline_config.ingest_workers,
+            batch_wait=pipeline_config.batch_wait_seconds,
+            journal=journal
+        )
+
+    def run(self, images):
+        stages = [
+            threading.Thread(target=self.stage, args=(self.list_images, images), name="listing", daemon=True),
+            threading.Thread(target=self.stage, args=(self.annotate_images,), name="annotation", daemon=True),
+            threading.Thread(target=self.stage, args=(self.resolve_licenses,), name="resolution", daemon=True),
+            threading.Thread(target=self.stage, args=(self.publish_images,), name="publishing", daemon=True),
+        ]
+        for thread in stages:
+            thread.start()
+        try:
+            self.done.wait()
+        finally:
+            # stop the stages when the main thread is interrupted too, so nothing is published after run returns
+            self.done.set()
+            for thread in stages:
+                thread.join()
+            self.ingest_executor.shutdown(wait=True, cancel_futures=True)
+        if self.error is not None:
+            raise self.error
+
+    def stage(self, target, *args):
+        try:
+            target(*args)
+        except BaseException as error:
+            self.fail(error)
+
+    def fail(self, error):
+        with self.lock:
+            if self.error is None:
+                self.error = error
+        self.done.set()
+
+    def put(self, stage_queue, item):
+        # blocking put that gives up when the run is over
+        while not self.done.is_set():
+            try:
+                stage_queue.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, stage_queue, timeout=POLL_INTERVAL):
+        try:
+            return stage_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    # --- blob listing ---
+
+    def list_images(self, images):
+        for image in images:
+            if self.done.is_set():
+                return
+            if self.journal is not None and not self.journal.restore(image):
+                continue
+            with self.lock:
+                self.in_pipeline += 1
+            # images restored from the journal may already have all the matches they need
+            if image.is_eligible_to_get_more_matches:
+                self.put(self.annotate_queue, image)
+            else:
+                self.put(self.publish_queue, image)
+        with self.lock:
+            self.listing_done = True
+            finished = self.in_pipeline == 0
+        if finished:
+            self.done.set()
+
+    # --- Vision annotation ---
+
+    def annotate_images(self):
+        while not self.done.is_set():
+            batch = self.next_batch()
+            if not batch:
+                continue
+            while not self.vision_slots.acquire(timeout=POLL_INTERVAL):
+                if self.done.is_set():
+                    return
+            limits = [image.match_limit for image in batch]
+            future = self.vision.executor.submit(self.vision.annotate, batch, limits)
+            future.add_done_callback(lambda f, batch=batch: self.annotated(batch, f))
+
+    def next_batch(self):
+        """Waits for a first image, then gives the batch up to `batch_wait` seconds to fill up."""
+        batch = []
+        deadline = None
+        while len(batch) < BATCH_SIZE and not self.done.is_set():
+            image = self.next_image_to_annotate(POLL_INTERVAL if deadline is None else max(0.0, deadline - time.monotonic()))
+            if image is not None:
+                batch.append(image)
+                if deadline is None:
+                    deadline = time.monotonic() + self.batch_wait
+            elif batch and time.monotonic() >= deadline:
+                break
+            elif not batch:
+                return batch
+        return batch
+
+    def next_image_to_annotate(self, timeout):
+        try:
+            return self.reannotate_queue.get_nowait()
+        except queue.Empty:
+            return self.get(self.annotate_queue, timeout)
+
+    def annotated(self, batch, future):
+        self.vision_slots.release()
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.fail(error)
+            return
+        for image, response in zip(batch, future.result()):
+            self.put(self.resolve_queue, (image, response))
+
+    # --- license resolution ---
+
+    def resolve_licenses(self):
+        while not self.done.is_set():
+            item = self.get(self.resolve_queue)
+            if item is None:
+                continue
+            image, response = item
+            new_matches = new_image_matches(image, response)
+            resolutions = self.license_resolver.submit(new_matches)
+            while not self.ingest_slots.acquire(timeout=POLL_INTERVAL):
+                if self.done.is_set():
+                    return
+            future = self.ingest_executor.submit(self.ingest, image, resolutions)
+            future.add_done_callback(self.ingested)
+
+    def ingest(self, image, resolutions):
+        for match in resolutions:
+            image.add_match(match)
+            if image.has_enough:
+                resolutions.cancel()
+                break
+        if self.journal is not None:
+            self.journal.record(image)
+        if image.is_eligible_to_get_more_matches:
+            self.reannotate_queue.put(image)
+        else:
+            self.put(self.publish_queue, image)
+
+    def ingested(self, future):
+        self.ingest_slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            self.fail(future.exception())
+
+    # --- row publishing ---
+
+    def publish_images(self):
+        while not self.done.is_set():
+            image = self.get(self.publish_queue)
+            if image is None:
+                continue
+            image.publish(self.publish_method)
+            with self.lock:
+                self.in_pipeline -= 1
+                finished = self.listing_done and self.in_pipeline == 0
+            if finished:
+                self.done.set()
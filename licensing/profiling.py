@@ -0,0 +1,177 @@
+import contextlib
+import importlib
+import inspect
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+DEFAULT_DIRECTORY = "internals/profiles"
+
+# the frame each stage's work runs under, by (file, function)
+STAGES = {
+    "vision": ("google_apis/vision.py", "annotate"),
+    "fetch": ("licensing/page_fetcher.py", "fetch"),
+    "parse": ("licensing/license.py", "parse_html_for_metadata"),
+    "publish": ("licensing/pipeline.py", "publish_images"),
+}
+
+# files whose leaf frames mean the thread is only waiting on a lock, a queue, the network or for work
+IDLE_FILES = (
+    "threading.py", "queue.py", "selectors.py", "socket.py", "ssl.py",
+    os.path.join("concurrent", "futures", "thread.py"),
+)
+
+
+class Profiler:
+    """
+    Profiles the code run inside it, in every thread:
+
+    - `functions.txt`: per-function report of stack samples, by own and cumulative samples
+    - `stacks.collapsed`: the samples as collapsed stacks, for flamegraph.pl or speedscope
+    - `allocations.txt`: the code holding the most memory allocated while profiling
+
+    Stacks are sampled every `interval` seconds, skipping threads that are idle or blocked
+    on a socket. Given a `stage` (see `STAGES`), only the samples and allocations under
+    that stage's frame are kept.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, stage=None, interval=0.005, allocation_frames=25):
+        self.directory = os.path.join(directory, time.strftime("%Y%m%d-%H%M%S"))
+        self.stage = stage
+        self.interval = interval
+        self.allocation_frames = allocation_frames
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample_periodically, name="profiler", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        tracemalloc.start(self.allocation_frames)
+        self.sampler.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.write_stacks(os.path.join(self.directory, "stacks.collapsed"))
+        self.write_functions(os.path.join(self.directory, "functions.txt"))
+        self.write_allocations(os.path.join(self.directory, "allocations.txt"), snapshot)
+        print(f"Profile of {self.samples} samples written to {self.directory}")
+
+    def sample_periodically(self):
+        sampler_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = self.stage_stack(frame_stack(frame))
+                if stack:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    def stage_stack(self, stack):
+        """Returns the part of the stack to record, or None for idle threads and work outside the stage."""
+        if not stack or stack[-1].co_filename.endswith(IDLE_FILES):
+            return None
+        if self.stage is not None:
+            marker = STAGES[self.stage]
+            starts = [i for i, code in enumerate(stack)
+                      if code.co_name == marker[1] and code.co_filename.endswith(marker[0])]
+            if not starts:
+                return None
+            stack = stack[starts[0]:]
+        return tuple(frame_label(frame) for frame in stack)
+
+    def write_stacks(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+    def write_functions(self, path):
+        own = Counter()
+        cumulative = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                cumulative[label] += count
+        total = sum(self.stacks.values())
+
+        with open(path, "w") as f:
+            f.write(f"{total} samples every {self.interval * 1000:g} ms"
+                    f"{f' in the {self.stage} stage' if self.stage else ''}\n\n")
+            f.write(f"{'own':>8} {'own %':>7} {'cumul':>8} {'cumul %':>8}  function\n")
+            divisor = total or 1
+            for label, count in cumulative.most_common():
+                f.write(f"{own[label]:>8} {own[label] / divisor:>7.1%} {count:>8} {count / divisor:>8.1%}  {label}\n")
+
+    def write_allocations(self, path, snapshot, limit=30):
+        statistics = snapshot.statistics("traceback")
+        if self.stage is not None:
+            filename, lines = stage_lines(self.stage)
+            statistics = [statistic for statistic in statistics
+                          if any(frame.filename.endswith(filename) and frame.lineno in lines
+                                 for frame in statistic.traceback)]
+        with open(path, "w") as f:
+            f.write(f"Memory still allocated at the end of profiling{f' by the {self.stage} stage' if self.stage else ''}\n\n")
+            for statistic in statistics[:limit]:
+                f.write(f"{statistic.size / 1024:.1f} KiB in {statistic.count} blocks\n")
+                for line in statistic.traceback.format(most_recent_first=True)[:12]:
+                    f.write(f"  {line}\n")
+                f.write("\n")
+
+
+def stage_lines(stage):
+    """
+    Returns the file and the lines of the stage's marker function, since allocation
+    tracebacks only record the file and line of each frame.
+    """
+    filename, function = STAGES[stage]
+    module = importlib.import_module(filename.removesuffix(".py").replace("/", "."))
+    lines = set()
+    namespaces = [vars(module)] + [vars(value) for value in vars(module).values() if inspect.isclass(value)]
+    for namespace in namespaces:
+        value = namespace.get(function)
+        code = getattr(getattr(value, "__func__", value), "__code__", None)
+        if code is not None and code.co_filename.endswith(filename):
+            lines.update(line for _, _, line in code.co_lines() if line is not None)
+    return filename, lines
+
+
+def frame_stack(frame):
+    """Returns the code objects of the frames from the outermost to `frame`."""
+    stack = []
+    while frame is not None:
+        stack.append(frame.f_code)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def frame_label(code):
+    function = getattr(code, "co_qualname", code.co_name)
+    return f"{function} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", action="store_true", help=f"Record a CPU and allocation profile into {DEFAULT_DIRECTORY}.")
+    parser.add_argument("--profile-stage", choices=list(STAGES), help="Only profile this stage.")
+
+
+def profiling(args):
+    """Returns the profiler the command line arguments ask for, or a context that does nothing."""
+    if not args.profile and args.profile_stage is None:
+        return contextlib.nullcontext()
+    return Profiler(stage=args.profile_stage)
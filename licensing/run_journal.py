@@ -0,0 +1,122 @@
+import time
+
+from licensing.image import ImageMatch
+from licensing.license import License
+from licensing.sqlite_store import SqliteStore
+
+
+class RunJournal(SqliteStore):
+    """
+    Crash-safe record of a run over a bucket: the spreadsheet it writes to and, per image,
+    the Vision rounds done, the matches with their resolved licenses and whether its row
+    was written. A run that didn't finish can be resumed into the same spreadsheet,
+    redoing only the unfinished images.
+    """
+
+    filename = "journal.sqlite"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS runs ("
+        "run_id INTEGER PRIMARY KEY, bucket TEXT NOT NULL, spreadsheet_id TEXT NOT NULL, "
+        "next_row INTEGER NOT NULL, started_at REAL NOT NULL, finished_at REAL)",
+        "CREATE TABLE IF NOT EXISTS images ("
+        "run_id INTEGER NOT NULL, name TEXT NOT NULL, generation TEXT, "
+        "search_rounds INTEGER NOT NULL, search_exhausted INTEGER NOT NULL, "
+        "match_count INTEGER NOT NULL, published INTEGER NOT NULL, "
+        "PRIMARY KEY (run_id, name))",
+        "CREATE TABLE IF NOT EXISTS matches ("
+        "run_id INTEGER NOT NULL, name TEXT NOT NULL, matching_index INTEGER NOT NULL, "
+        "page_url TEXT, title TEXT, image_url TEXT, matching_type TEXT, "
+        "license_text TEXT, license_error TEXT, license_url TEXT, "
+        "PRIMARY KEY (run_id, name, matching_index))",
+    )
+
+    def __init__(self, directory, bucket):
+        super().__init__(directory)
+        self.bucket = bucket
+        self.run_id = None
+
+    @classmethod
+    def from_config(cls, cache_config, image_config):
+        return cls(directory=cache_config.directory, bucket=image_config.bucket)
+
+    def unfinished_run(self):
+        """Returns the (spreadsheet_id, next_row) of the last unfinished run over the bucket, or None."""
+        row = self.connection.execute(
+            "SELECT run_id, spreadsheet_id, next_row FROM runs "
+            "WHERE bucket = ? AND finished_at IS NULL ORDER BY run_id DESC LIMIT 1",
+            (self.bucket,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.run_id = row[0]
+        return row[1], row[2]
+
+    def start(self, spreadsheet_id, next_row):
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (bucket, spreadsheet_id, next_row, started_at) VALUES (?, ?, ?, ?)",
+                (self.bucket, spreadsheet_id, next_row, time.time())
+            )
+            self.run_id = cursor.lastrowid
+
+    def restore(self, image):
+        """
+        Restores the journaled matches and search state of `image`.
+        Returns False when its row was already written, and there is nothing left to do.
+        """
+        with self.lock:
+            state = self.connection.execute(
+                "SELECT generation, search_rounds, search_exhausted, published FROM images "
+                "WHERE run_id = ? AND name = ?",
+                (self.run_id, image.name)
+            ).fetchone()
+            # a blob overwritten since it was journaled starts over
+            if state is None or state[0] != str(image.blob.generation):
+                return True
+            if state[3]:
+                return False
+            rows = self.connection.execute(
+                "SELECT page_url, title, image_url, matching_type, license_text, license_error, license_url "
+                "FROM matches WHERE run_id = ? AND name = ? ORDER BY matching_index",
+                (self.run_id, image.name)
+            ).fetchall()
+        for page_url, title, image_url, matching_type, text, error, url in rows:
+            match = ImageMatch(page_url, title, image_url, matching_type)
+            match.license = License(text, error, url)
+            image.add_match(match)
+        image.search_rounds = state[1]
+        image.search_exhausted = bool(state[2])
+        return True
+
+    def record(self, image):
+        """Journals the search state of `image` and the matches added since the last record."""
+        with self.lock, self.connection:
+            stored = self.connection.execute(
+                "SELECT match_count FROM images WHERE run_id = ? AND name = ?", (self.run_id, image.name)
+            ).fetchone()
+            match_count = stored[0] if stored else 0
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (self.run_id, image.name, m.matching_index, m.page_url, m.title, m.image_url, m.matching_type,
+                     m.license.text, m.license.error, m.license.url)
+                    for m in image.matches[match_count:]
+                ]
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (self.run_id, image.name, str(image.blob.generation), image.search_rounds,
+                 int(image.search_exhausted), len(image.matches))
+            )
+
+    def record_published(self, names, next_row):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "UPDATE images SET published = 1 WHERE run_id = ? AND name = ?",
+                [(self.run_id, name) for name in names]
+            )
+            self.connection.execute("UPDATE runs SET next_row = ? WHERE run_id = ?", (next_row, self.run_id))
+
+    def finish(self):
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import threading
+
+
+class Shard:
+    """One of `count` disjoint parts of a bucket, chosen by a stable hash of the blob names."""
+
+    def __init__(self, index, count):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, text):
+        """Parses an `i/N` shard specification."""
+        index, _, count = text.partition("/")
+        try:
+            return cls(int(index), int(count))
+        except ValueError:
+            raise ValueError(f"Invalid shard '{text}', expected i/N with 0 <= i < N")
+
+    def __contains__(self, name):
+        return stable_hash(name) % self.count == self.index
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+class ShardSink:
+    """
+    Rows of one shard, appended to a JSON lines file under the shards directory so the
+    shards can run in separate processes or machines and be merged afterwards.
+    A shard that is run again skips the images whose row is already in its file.
+    """
+
+    def __init__(self, directory, bucket, shard):
+        os.makedirs(directory, exist_ok=True)
+        self.path = shard_path(directory, bucket, shard.index, shard.count)
+        self.names = {name for name, _ in read_rows(self.path)} if os.path.exists(self.path) else set()
+        # called with the keys of the rows after every write, like GoogleSheet.on_rows_written
+        self.on_rows_written = None
+        self.lock = threading.Lock()
+        self.file = open(self.path, "a", encoding="utf-8")
+        if self.file.tell() and not ends_with_newline(self.path):
+            self.file.write("\n")
+
+    @classmethod
+    def from_config(cls, sharding_config, image_config, shard):
+        return cls(directory=sharding_config.directory, bucket=image_config.bucket, shard=shard)
+
+    def append_row(self, row, key=None):
+        with self.lock:
+            self.file.write(json.dumps({"name": key, "row": row}) + "\n")
+            self.file.flush()
+            self.names.add(key)
+        if self.on_rows_written is not None:
+            self.on_rows_written([key], None)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def merge_shards(directory, bucket, count):
+    """Returns the rows of all `count` shards of the bucket in blob name order."""
+    rows = []
+    for index in range(count):
+        path = shard_path(directory, bucket, index, count)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Shard {index}/{count} has no rows at {path}")
+        rows.extend(read_rows(path))
+    rows.sort(key=lambda name_row: name_row[0])
+    return [row for _, row in rows]
+
+
+def read_rows(path):
+    rows = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short by a crash, its image is redone
+                continue
+            rows[entry["name"]] = entry["row"]
+    return rows.items()
+
+
+def ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def shard_path(directory, bucket, index, count):
+    return os.path.join(directory, f"{bucket}.shard-{index}-of-{count}.jsonl")
+
+
+def stable_hash(name):
+    # unlike hash(), the same in every process
+    return int.from_bytes(hashlib.md5(name.encode("utf-8")).digest()[:8], "big")
@@ -0,0 +1,27 @@
+import os
+import sqlite3
+import threading
+
+
+class SqliteStore:
+    """
+    Base of the stores kept in a SQLite file under `directory` and shared between threads.
+    Subclasses set the `filename` and the `schema` statements creating their tables,
+    and run their statements on `self.connection` holding `self.lock`.
+    """
+
+    filename = None
+    schema = ()
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.filename)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.connection:
+            for statement in self.schema:
+                self.connection.execute(statement)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
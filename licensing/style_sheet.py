@@ -8,7 +8,7 @@ def style_sheet(sheet, header_spec, sheet_style):
 
     column_indices = {k: find_column_indices(header_spec.names, k) for k in Width.model_fields}
 
-    style = GoogleSheetStyle(sheet.worksheet.id, sheet.spreadsheet_id, sheet.creds)
+    style = GoogleSheetStyle(sheet.worksheet.id, sheet.spreadsheet_id)
 
     # general style characteristics
     style.bold(0, num_header_rows)
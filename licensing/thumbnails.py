@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+
+from licensing.sqlite_store import SqliteStore
+
+THUMB_SIZE = (110, 110)
+
+
+class ThumbnailCache(SqliteStore):
+    """
+    Thumbnails stored under `directory` by the sha256 of their source image, so an image
+    is only resized once whatever url it's found at. The ETag each url was served with
+    is kept, and an unchanged image is not downloaded again.
+    """
+
+    filename = "thumbnails.sqlite"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS sources (image_url TEXT PRIMARY KEY, etag TEXT, content_hash TEXT NOT NULL)",
+    )
+
+    def __init__(self, directory, max_workers=16, timeout=10):
+        super().__init__(directory)
+        self.directory = directory
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+
+    def thumbnail_paths(self, image_urls):
+        """Returns the thumbnail path of each image url, None where it couldn't be made, downloading in parallel."""
+        return list(self.executor.map(self.thumbnail_path, image_urls))
+
+    def thumbnail_path(self, image_url):
+        try:
+            return self.get_or_create(image_url)
+        except Exception as e:
+            print(f"Failed to process image {image_url}: {e}")
+            return None
+
+    def get_or_create(self, image_url):
+        with self.lock:
+            source = self.connection.execute(
+                "SELECT etag, content_hash FROM sources WHERE image_url = ?", (image_url,)
+            ).fetchone()
+        headers = {}
+        if source is not None and source[0] and os.path.exists(self.thumb_path(source[1])):
+            headers["If-None-Match"] = source[0]
+
+        resp = self.session.get(image_url, headers=headers, timeout=self.timeout)
+        if resp.status_code == 304:
+            self.count(hit=True)
+            return self.thumb_path(source[1])
+        resp.raise_for_status()
+
+        content_hash = hashlib.sha256(resp.content).hexdigest()
+        thumb_path = self.thumb_path(content_hash)
+        self.count(hit=os.path.exists(thumb_path))
+        if not os.path.exists(thumb_path):
+            write_thumbnail(resp.content, thumb_path)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+                (image_url, resp.headers.get("ETag"), content_hash)
+            )
+        return thumb_path
+
+    def thumb_path(self, content_hash):
+        return os.path.join(self.directory, f"{content_hash}.jpg")
+
+    def count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+        super().close()
+
+
+def write_thumbnail(content, thumb_path):
+    from PIL import Image
+    img = Image.open(BytesIO(content))
+    # let the JPEG decoder scale down by up to 8x while decoding, still at least THUMB_SIZE
+    img.draft("RGB", THUMB_SIZE)
+    img = img.convert("RGB")
+    img.thumbnail(THUMB_SIZE, Image.LANCZOS)
+    # written aside and renamed so a concurrent or interrupted write never leaves a partial thumbnail
+    temporary_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+    img.save(temporary_path, format="JPEG")
+    os.replace(temporary_path, thumb_path)
@@ -1,34 +1,137 @@
+import argparse
 from licensing.style_sheet import style_sheet
 from google_apis.vision import Vision
+from google_apis.vision_cache import VisionResponseCache
 from google_apis.sheet import GoogleSheet
 from licensing.config import Configuration
 from licensing.image import ImageSet
+from licensing.license_cache import LicenseCache
+from licensing.license_resolver import LicenseResolver
+from licensing.metrics import metrics
+from licensing.domain_profiles import DomainProfiles
+from licensing.page_fetcher import PageFetcher
+from licensing.pipeline import Pipeline
+from licensing.profiling import add_profile_arguments, profiling
+from licensing.run_journal import RunJournal
+from licensing.blob_manifest import BlobManifest
+from licensing.shard import Shard, ShardSink, merge_shards
 from licensing.sheet_row import SheetRow
 
-def main():
+def main(new_run=False, shard=None):
+    """
+    Runs over the whole bucket into a spreadsheet or, given a `shard`, over that shard
+    into its own file for `merge` to combine.
+    """
     config = Configuration.load()
 
-    image_set = ImageSet.from_bucket(config.images, config.search)
-
     match_count = config.sheet_style.match_count
     header_spec = SheetRow.header_spec(match_count)
-    sheet = GoogleSheet(config.spreadsheet, header_spec.rows)
-    style_sheet(sheet, header_spec, config.sheet_style)
+
+    journal = None
+    if shard is not None:
+        sheet = ShardSink.from_config(config.sharding, config.images, shard)
+        print(f"Running shard {shard} into {sheet.path}")
+    else:
+        journal = RunJournal.from_config(config.cache, config.images)
+        unfinished_run = None if new_run else journal.unfinished_run()
+        if unfinished_run is None:
+            sheet = create_sheet(config, header_spec)
+            journal.start(sheet.spreadsheet_id, sheet.next_row)
+        else:
+            spreadsheet_id, next_row = unfinished_run
+            print("Resuming unfinished run")
+            sheet = GoogleSheet(config.spreadsheet, header_spec.rows, spreadsheet_id, next_row)
+    manifest = BlobManifest.from_config(config.cache, config.images)
+    # images published after a Vision error, left out of the manifest so the next run retries them
+    vision_errors = set()
+
+    def rows_written(names, next_row):
+        if journal is not None:
+            journal.record_published(names, next_row)
+        manifest.mark_processed([name for name in names if name not in vision_errors])
+
+    sheet.on_rows_written = rows_written
 
     def publish_image(image):
+        if image.vision_error:
+            vision_errors.add(image.name)
         sheet.append_row(
             SheetRow
             .from_image(image)
-            .values(match_count)
+            .values(match_count),
+            key=image.name
         )
 
-    vision = Vision()
-    has_unprocessed_images = True
-    while has_unprocessed_images:
-        vision.batch_search(image_set, publish_method=publish_image)
-        has_unprocessed_images = image_set.eligible_to_get_more_matches()
+    license_cache = LicenseCache.from_config(config.cache, config.license_lookup)
+    domain_profiles = DomainProfiles.from_config(config.cache, config.license_lookup)
+    page_fetcher = PageFetcher.from_config(config.license_lookup, domain_profiles)
+    license_resolver = LicenseResolver.from_config(config.license_lookup, license_cache, page_fetcher)
+    vision_cache = VisionResponseCache.from_config(config.cache, config.search)
+    vision = Vision(vision_cache, config.search.vision_batches_in_flight)
+    pipeline = Pipeline.from_config(config.pipeline, config.search, vision, license_resolver, publish_image, journal)
+    images = ImageSet.stream_bucket(config.images, config.search, manifest, shard)
+    if shard is not None:
+        # a shard that is run again only redoes the images missing from its file
+        images = (image for image in images if image.name not in sheet.names)
+    try:
+        pipeline.run(images)
+    finally:
+        # drop the queued Vision calls and page fetches when the run fails or is interrupted
+        vision.close()
+        license_resolver.close()
+        page_fetcher.close()
+        # publish the buffered rows even when the run fails
+        sheet.close()
+        metrics.export(config.metrics.directory)
+        print(f"Run metrics written to {config.metrics.directory}")
+    if journal is not None:
+        journal.finish()
+        journal.close()
+    manifest.close()
+
+    domain_profiles.close()
+    print("License cache:", license_cache.stats)
+    license_cache.close()
+    print("Vision cache:", vision_cache.stats)
+    vision_cache.close()
+
+    if shard is not None:
+        print(f"Shard {shard} complete, merge the shards with --merge {shard.count}")
+    else:
+        print("Spreadsheet complete: https://docs.google.com/spreadsheets/d/" + sheet.spreadsheet_id + "/edit")
+
+def merge(shard_count):
+    """Builds the spreadsheet from the rows of all shards, in blob order."""
+    config = Configuration.load()
+    header_spec = SheetRow.header_spec(config.sheet_style.match_count)
+    rows = merge_shards(config.sharding.directory, config.images.bucket, shard_count)
+
+    sheet = create_sheet(config, header_spec)
+    for row in rows:
+        sheet.append_row(row)
+    sheet.close()
+    print(f"Merged {len(rows)} rows from {shard_count} shards: https://docs.google.com/spreadsheets/d/" + sheet.spreadsheet_id + "/edit")
+
+def create_sheet(config, header_spec):
+    sheet = GoogleSheet(config.spreadsheet, header_spec.rows)
+    style_sheet(sheet, header_spec, config.sheet_style)
+    return sheet
 
-    print("Spreadsheet complete: https://docs.google.com/spreadsheets/d/" + sheet.spreadsheet_id + "/edit")
+def parse_shard(text):
+    try:
+        return Shard.parse(text)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Find where the bucket's images come from and their licenses.")
+    parser.add_argument("--new-run", action="store_true", help="Start a new spreadsheet instead of resuming an unfinished run.")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N", help="Process only shard i of N of the bucket, into its own file.")
+    parser.add_argument("--merge", type=int, metavar="N", help="Build the spreadsheet from the files of shards 0 to N-1.")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profiling(args):
+        if args.merge is not None:
+            merge(args.merge)
+        else:
+            main(new_run=args.new_run, shard=args.shard)
\ No newline at end of file
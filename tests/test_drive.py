@@ -0,0 +1,89 @@
+import pytest
+
+from google_apis import drive
+from google_apis.drive_index import DriveUploadIndex
+
+FOLDER_ID = "folder"
+PUBLIC = [{"type": "anyone"}]
+
+
+class StubUploader:
+    """Uploads by numbering new files, and fails the grants of the ids in `failing_grants`."""
+
+    def __init__(self, failing_grants=()):
+        self.failing_grants = set(failing_grants)
+        self.uploads = []
+        self.granted = []
+
+    def upload_all(self, uploads):
+        self.uploads.extend(metadata for metadata, _ in uploads)
+        return [{"id": metadata.get("id", f"new-{metadata['name']}")} for metadata, _ in uploads]
+
+    def make_public(self, file_ids):
+        self.granted.extend(file_id for file_id in file_ids if file_id not in self.failing_grants)
+        return [file_id for file_id in file_ids if file_id in self.failing_grants]
+
+
+@pytest.fixture
+def folder(monkeypatch):
+    """The files listed in the Drive folder, as the stub service returns them."""
+    items = []
+
+    class Request:
+        def execute(self):
+            return {"files": list(items)}
+
+    class Files:
+        def list(self, **kwargs):
+            return Request()
+
+    service = type("StubService", (), {"files": lambda self: Files()})()
+    monkeypatch.setattr(drive, "get_service", lambda name, version: service)
+    return items
+
+
+@pytest.fixture
+def upload_index(tmp_path):
+    index = DriveUploadIndex(str(tmp_path))
+    yield index
+    index.close()
+
+
+def upload(name, md5):
+    return name, "image/jpeg", md5, lambda: None
+
+
+def test_file_whose_grant_failed_is_granted_again_on_reuse(folder, upload_index):
+    uploader = StubUploader(failing_grants={"new-a.jpg"})
+    assert drive.publish_files(uploader, upload_index, FOLDER_ID, [upload("a.jpg", "md5-a")]) == [None]
+
+    folder.append({"id": "new-a.jpg", "name": "a.jpg", "md5Checksum": "md5-a"})
+    uploader = StubUploader()
+    assert drive.publish_files(uploader, upload_index, FOLDER_ID, [upload("a.jpg", "md5-a")]) == ["new-a.jpg"]
+    assert uploader.uploads == []
+    assert uploader.granted == ["new-a.jpg"]
+
+
+def test_file_reused_from_the_listing_is_granted_when_private(folder, upload_index):
+    folder.append({"id": "remote", "name": "other.jpg", "md5Checksum": "md5-a"})
+    uploader = StubUploader()
+    assert drive.publish_files(uploader, upload_index, FOLDER_ID, [upload("a.jpg", "md5-a")]) == ["remote"]
+    assert uploader.granted == ["remote"]
+    assert upload_index.get(FOLDER_ID, "a.jpg") == ("remote", "md5-a")
+
+
+def test_public_files_are_not_granted_again(folder, upload_index):
+    folder.append({"id": "remote", "name": "a.jpg", "md5Checksum": "md5-a", "permissions": PUBLIC})
+    folder.append({"id": "old-b", "name": "b.jpg", "md5Checksum": "md5-old", "permissions": PUBLIC})
+    uploader = StubUploader()
+    files = [upload("a.jpg", "md5-a"), upload("b.jpg", "md5-b"), upload("c.jpg", "md5-c")]
+    assert drive.publish_files(uploader, upload_index, FOLDER_ID, files) == ["remote", "old-b", "new-c.jpg"]
+    assert [metadata.get("id") for metadata in uploader.uploads] == ["old-b", None]
+    assert uploader.granted == ["new-c.jpg"]
+
+
+def test_indexed_file_deleted_from_drive_is_uploaded_again(folder, upload_index):
+    upload_index.put(FOLDER_ID, "a.jpg", "deleted", "md5-a")
+    uploader = StubUploader()
+    assert drive.publish_files(uploader, upload_index, FOLDER_ID, [upload("a.jpg", "md5-a")]) == ["new-a.jpg"]
+    assert upload_index.get(FOLDER_ID, "a.jpg") == ("new-a.jpg", "md5-a")
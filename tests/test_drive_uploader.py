@@ -0,0 +1,125 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from google_apis.drive_uploader import DriveUploader
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"")
+
+
+class StubUploader(DriveUploader):
+    """Answers each grant attempt with the next error queued for that file, success when there are none left."""
+
+    def __init__(self, errors, **kwargs):
+        super().__init__(backoff=0, **kwargs)
+        self.errors = errors
+        self.granted = []
+
+    def grant_batch(self, file_ids):
+        failed = []
+        for file_id in file_ids:
+            errors = self.errors.get(file_id)
+            if errors:
+                failed.append((file_id, errors.pop(0)))
+            else:
+                self.granted.append(file_id)
+        return failed
+
+
+@pytest.fixture
+def uploader_factory():
+    uploaders = []
+
+    def make(errors, **kwargs):
+        uploader = StubUploader(errors, **kwargs)
+        uploaders.append(uploader)
+        return uploader
+    yield make
+    for uploader in uploaders:
+        uploader.close()
+
+
+def test_make_public_keeps_permanent_failures_across_retries(uploader_factory):
+    uploader = uploader_factory({"A": [http_error(404)], "B": [http_error(429)]})
+    assert uploader.make_public(["A", "B", "C"]) == ["A"]
+    assert sorted(uploader.granted) == ["B", "C"]
+
+
+def test_make_public_returns_grants_still_failing_after_the_last_attempt(uploader_factory):
+    uploader = uploader_factory({"A": [http_error(503)] * 3, "B": [http_error(403)]}, max_attempts=3)
+    assert sorted(uploader.make_public(["A", "B", "C"])) == ["A", "B"]
+    assert uploader.granted == ["C"]
+
+
+def test_make_public_retries_rate_limited_grants_in_batches(uploader_factory):
+    uploader = uploader_factory({"2": [http_error(500)]}, batch_size=2)
+    assert uploader.make_public([str(i) for i in range(5)]) == []
+    assert sorted(uploader.granted) == [str(i) for i in range(5)]
+
+
+class StubRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class StubFiles:
+    """Drive `files()` resource failing the first calls of each method with the errors queued for it."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.calls = []
+
+    def call(self, method, result):
+        self.calls.append(method)
+        errors = self.errors.get(method)
+        return StubRequest(errors.pop(0) if errors else result)
+
+    def create(self, body, media_body, fields):
+        return self.call("create", {"id": "new"})
+
+    def update(self, fileId, body, media_body, fields):
+        return self.call("update", {"id": fileId})
+
+
+@pytest.fixture
+def stub_files(monkeypatch):
+    def install(errors):
+        files = StubFiles(errors)
+        service = type("StubService", (), {"files": lambda self: files})()
+        monkeypatch.setattr("google_apis.drive_uploader.get_service", lambda name, version: service)
+        return files
+    return install
+
+
+def test_upload_retries_rate_limits_and_server_errors(uploader_factory, stub_files):
+    files = stub_files({"create": [http_error(429), http_error(503)]})
+    made = []
+    file = uploader_factory({}).upload({"name": "a.jpg"}, lambda: made.append(1))
+    assert file == {"id": "new"}
+    assert files.calls == ["create"] * 3
+    assert len(made) == 3
+
+
+def test_upload_does_not_retry_client_errors(uploader_factory, stub_files):
+    stub_files({"create": [http_error(400)]})
+    with pytest.raises(HttpError):
+        uploader_factory({}).upload({"name": "a.jpg"}, lambda: None)
+
+
+def test_upload_creates_a_file_deleted_from_drive_again(uploader_factory, stub_files):
+    files = stub_files({"update": [http_error(404)]})
+    assert uploader_factory({}).upload({"id": "gone", "name": "a.jpg"}, lambda: None) == {"id": "new"}
+    assert files.calls == ["update", "create"]
+
+
+def test_upload_all_returns_none_for_failed_uploads(uploader_factory, stub_files):
+    stub_files({"create": [http_error(403)]})
+    uploaded = uploader_factory({}, max_workers=1).upload_all([({"name": "a"}, lambda: None), ({"name": "b"}, lambda: None)])
+    assert uploaded == [None, {"id": "new"}]
@@ -0,0 +1,82 @@
+import re
+import threading
+import time
+
+import pytest
+
+from google_apis import drive
+
+PAGE_SIZE = 1000
+
+
+class StubFolders:
+    """Drive `files()` resource listing a tree of folders held in memory, page by page."""
+
+    def __init__(self, children):
+        self.children = children
+        self.list_calls = 0
+        self.lock = threading.Lock()
+
+    def list(self, q, fields, pageToken=None, pageSize=PAGE_SIZE):
+        with self.lock:
+            self.list_calls += 1
+        folder_id = re.match(r"'(.+)' in parents", q).group(1)
+        start = int(pageToken or 0)
+        items = self.children.get(folder_id, [])
+        page = {"files": items[start:start + pageSize]}
+        if start + pageSize < len(items):
+            page["nextPageToken"] = str(start + pageSize)
+        return type("Request", (), {"execute": lambda self: page})()
+
+
+def folder(folder_id):
+    return {"id": folder_id, "name": folder_id, "mimeType": drive.FOLDER_MIME_TYPE}
+
+
+def files(prefix, count):
+    return [{"id": f"{prefix}-{i}", "name": f"{i}.jpg", "mimeType": "image/jpeg"} for i in range(count)]
+
+
+@pytest.fixture
+def stub_folders(monkeypatch):
+    def install(children):
+        folders = StubFolders(children)
+        service = type("StubService", (), {"files": lambda self: folders})()
+        monkeypatch.setattr(drive, "get_service", lambda name, version: service)
+        return folders
+    return install
+
+
+def test_walk_folder_yields_every_file_of_the_tree(stub_folders):
+    stub_folders({
+        "root": files("root", 3) + [folder("a"), folder("b")],
+        "a": files("a", 5000) + [folder("c")],
+        "b": files("b", 4500),
+        "c": files("c", 5500),
+    })
+    walked = list(drive.walk_folder("root"))
+    assert len(walked) == 15_003
+    assert len({file["id"] for _, file in walked}) == 15_003
+    assert {path for path, _ in walked} == {"", "a/", "b/", "a/c/"}
+    assert all(path == {"root": "", "a": "a/", "b": "b/", "c": "a/c/"}[file["id"].split("-")[0]] for path, file in walked)
+
+
+def test_closing_the_walk_early_stops_listing(stub_folders):
+    folders = stub_folders({"root": [folder(str(i)) for i in range(50)], **{str(i): files(str(i), 5000) for i in range(50)}})
+    walk = drive.walk_folder("root", max_workers=2, buffered_pages=1)
+    next(walk)
+    walk.close()
+    time.sleep(0.5)
+    calls = folders.list_calls
+    time.sleep(0.3)
+    assert folders.list_calls == calls < 50 * 5
+    assert not any(thread.name.startswith("drive-walk") for thread in threading.enumerate())
+
+
+def test_list_files_in_folder_requests_pages_as_they_are_consumed(stub_folders):
+    folders = stub_folders({"root": files("root", 2500)})
+    listing = drive.list_files_in_folder("root")
+    next(listing)
+    assert folders.list_calls == 1
+    assert len(list(listing)) == 2499
+    assert folders.list_calls == 3
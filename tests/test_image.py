@@ -0,0 +1,34 @@
+import random
+import types
+
+import pytest
+
+from licensing.image import Image, ImageMatch
+from licensing.license import License
+
+LICENSES = [
+    License(None, "No license found", None),
+    License("All rights reserved", None, None),
+    License(None, None, "https://example.com/terms"),
+    License("https://creativecommons.org/licenses/by/4.0/", None, "https://creativecommons.org/licenses/by/4.0/"),
+    License("See https://creativecommons.org/licenses/by-sa/3.0/", None, None),
+]
+
+
+def random_match(rng, i):
+    match = ImageMatch(f"https://example.com/{i}", f"page {i}", f"https://example.com/{i}.jpg", "full")
+    match.license = rng.choice(LICENSES)
+    return match
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_counters_and_ranking_match_a_scan_of_the_matches(seed):
+    rng = random.Random(seed)
+    image = Image(types.SimpleNamespace(name="image.jpg"), search_config=None)
+    for i in range(rng.randint(0, 60)):
+        image.add_match(random_match(rng, i))
+
+        assert image.has_creative_commons_license == any(m.license.is_creative_commons_license for m in image.matches)
+        assert image.has_license_url == any(m.has_license_url for m in image.matches)
+        assert image.has_license_text == any(m.has_license_text for m in image.matches)
+        assert image.sorted_matches == sorted(image.matches, key=lambda m: m.sort_key)
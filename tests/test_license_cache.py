@@ -0,0 +1,25 @@
+import pytest
+
+from licensing.license import License
+from licensing.license_cache import LicenseCache
+
+MALFORMED_URLS = [
+    "http://a.com:port/x",
+    "http://example.com:99999/x",
+    "http://[abc/x",
+]
+
+
+@pytest.fixture
+def license_cache(tmp_path):
+    cache = LicenseCache(str(tmp_path), ttl_days=1, max_entries=10)
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize("page_url", MALFORMED_URLS)
+def test_malformed_url_skips_the_cache(license_cache, page_url):
+    license = license_cache.get_or_extract(page_url, License.extract_page_license_metadata)
+    assert license.error.startswith("Could not fetch page:")
+    assert not license.is_cacheable
+    assert license_cache.stats["size"] == 0
@@ -0,0 +1,105 @@
+import threading
+from collections import Counter
+from concurrent.futures import CancelledError
+
+import pytest
+
+from licensing.image import ImageMatch
+from licensing.license import License
+from licensing.license_resolver import LicenseResolver, url_domain
+
+
+class StubResolver(LicenseResolver):
+    """Looks pages up without fetching them, holding the pages of `blocked_domains` until `release` is set."""
+
+    def __init__(self, blocked_domains=(), **kwargs):
+        super().__init__(**kwargs)
+        self.blocked_domains = set(blocked_domains)
+        self.release = threading.Event()
+        self.looked_up = []
+        self.in_flight = Counter()
+        self.most_in_flight = Counter()
+        self.stats_lock = threading.Lock()
+
+    def lookup(self, page_url):
+        domain = url_domain(page_url)
+        with self.stats_lock:
+            self.looked_up.append(page_url)
+            self.in_flight[domain] += 1
+            self.most_in_flight[domain] = max(self.most_in_flight[domain], self.in_flight[domain])
+        if domain in self.blocked_domains:
+            self.release.wait(5)
+        with self.stats_lock:
+            self.in_flight[domain] -= 1
+        return License(f"license of {page_url}", None, None)
+
+
+@pytest.fixture
+def resolver_factory():
+    resolvers = []
+
+    def make(**kwargs):
+        resolver = StubResolver(**kwargs)
+        resolvers.append(resolver)
+        return resolver
+    yield make
+    for resolver in resolvers:
+        resolver.release.set()
+        resolver.close()
+
+
+def matches(*page_urls):
+    return [ImageMatch(page_url, None, None, "full") for page_url in page_urls]
+
+
+def test_busy_domain_does_not_hold_up_other_domains(resolver_factory):
+    resolver = resolver_factory(blocked_domains={"slow.com"}, max_workers=4, max_per_domain=1)
+    slow = resolver.submit(matches(*(f"https://slow.com/{i}" for i in range(3))))
+    fast = resolver.submit(matches(*(f"https://fast.com/{i}" for i in range(6))))
+
+    assert [match.license.text for match in fast] == [f"license of https://fast.com/{i}" for i in range(6)]
+    assert resolver.looked_up.count("https://slow.com/0") == 1
+    assert "https://slow.com/1" not in resolver.looked_up
+
+    resolver.release.set()
+    assert len(list(slow)) == 3
+    assert resolver.most_in_flight == {"slow.com": 1, "fast.com": 1}
+
+
+def test_domain_slots_are_shared_up_to_max_per_domain(resolver_factory):
+    resolver = resolver_factory(max_workers=8, max_per_domain=2)
+    resolutions = resolver.submit(matches(*(f"https://example.com/{i}" for i in range(20))))
+    assert len(list(resolutions)) == 20
+    assert resolver.most_in_flight["example.com"] <= 2
+    assert not resolver.waiting and not resolver.fetching
+
+
+def test_cancelled_resolutions_are_never_fetched(resolver_factory):
+    resolver = resolver_factory(blocked_domains={"slow.com"}, max_workers=2, max_per_domain=1)
+    resolutions = resolver.submit(matches(*(f"https://slow.com/{i}" for i in range(4))))
+    resolutions.cancel()
+    resolver.release.set()
+    resolver.close()
+    assert resolver.looked_up == ["https://slow.com/0"]
+
+
+def test_close_cancels_waiting_pages(resolver_factory):
+    resolver = resolver_factory(blocked_domains={"slow.com"}, max_workers=2, max_per_domain=1)
+    resolutions = resolver.submit(matches("https://slow.com/0", "https://slow.com/1"))
+    threading.Timer(0.1, resolver.release.set).start()
+    resolver.close()
+    assert resolutions.futures[0].result().text == "license of https://slow.com/0"
+    assert resolutions.futures[1].cancelled()
+    with pytest.raises(CancelledError):
+        list(resolutions)
+    assert resolver.looked_up == ["https://slow.com/0"]
+
+
+def test_malformed_and_missing_urls_share_one_domain(resolver_factory):
+    assert url_domain("http://[abc/x") is None
+    assert url_domain(None) is None
+    resolver = resolver_factory(max_workers=2, max_per_domain=1)
+    resolutions = resolver.submit(matches("http://[abc/x", None, "https://example.com/"))
+    assert [match.license.text for match in resolutions] == [
+        "license of http://[abc/x", "license of None", "license of https://example.com/"
+    ]
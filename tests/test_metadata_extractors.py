@@ -0,0 +1,33 @@
+import random
+import re
+
+import pytest
+
+from licensing.metadata_extractors import MAX_SENTENCE_CHARS, TEXT_KEYWORDS, text_metadata
+
+FRAGMENTS = TEXT_KEYWORDS + [".", ". ", " ", "\n", "a", "lic", "ense", "cc", "-", "public", "domain", "Usage rights", "x" * 20]
+
+
+def reference_text_metadata(text):
+    # the per-keyword regexes text_metadata replaced
+    text_info = {}
+    for keyword in TEXT_KEYWORDS:
+        if keyword in text:
+            for sentence in re.findall(r"([^.]*?{}[^.]*\.)".format(keyword), text):
+                text_info[f"text:{keyword}"] = sentence.strip()
+    return text_info
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_text_metadata_matches_the_per_keyword_regexes(seed):
+    rng = random.Random(seed)
+    for _ in range(1000):
+        text = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 40)))
+        assert text_metadata(text) == reference_text_metadata(text), text
+
+
+def test_text_metadata_clips_sentences_without_periods():
+    text = "x" * 10_000 + " license " + "y" * 10_000 + "."
+    sentence = text_metadata(text)["text:license"]
+    assert len(sentence) <= 2 * MAX_SENTENCE_CHARS + len("license")
+    assert "license" in sentence
@@ -0,0 +1,44 @@
+import signal
+import threading
+import time
+import types
+
+import pytest
+
+from licensing.image import Image
+from licensing.pipeline import Pipeline
+
+
+def exhausted_image(name):
+    # an image with no more matches to look for goes straight to publishing
+    image = Image(types.SimpleNamespace(name=name), search_config=None)
+    image.search_exhausted = True
+    return image
+
+
+def test_interrupted_run_stops_publishing_before_returning():
+    published = []
+
+    def publish(image):
+        if not published:
+            main_thread = threading.main_thread().ident
+            threading.Timer(0.05, signal.pthread_kill, (main_thread, signal.SIGINT)).start()
+        published.append(image.name)
+        time.sleep(0.05)
+
+    pipeline = Pipeline(vision=None, license_resolver=None, publish_method=publish)
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.run(exhausted_image(str(i)) for i in range(50))
+    published_when_interrupted = len(published)
+    time.sleep(0.3)
+    assert len(published) == published_when_interrupted < 50
+    with pytest.raises(RuntimeError):
+        pipeline.ingest_executor.submit(print)
+
+
+def test_run_publishes_every_image():
+    published = []
+    Pipeline(vision=None, license_resolver=None, publish_method=lambda image: published.append(image.name)).run(
+        exhausted_image(str(i)) for i in range(50)
+    )
+    assert sorted(published, key=int) == [str(i) for i in range(50)]
@@ -0,0 +1,11 @@
+import os
+
+from licensing.profiling import Profiler
+
+
+def test_stage_without_samples_reports_zero_samples(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), stage="parse")
+    with profiler:
+        pass
+    with open(os.path.join(profiler.directory, "functions.txt")) as f:
+        assert f.readline().startswith("0 samples every 5 ms in the parse stage")